@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,12 +48,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'littlelemon.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'littlelemon.middleware.LocationMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'littlelemon.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'api.urls'
@@ -127,3 +131,151 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'littlelemon.renderers.ORJSONRenderer',
+        'littlelemon.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'littlelemon.renderers.ORJSONParser',
+        'littlelemon.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'sixty': '60/minute',
+        'ten': '10/minute',
+        'five': '5/minute',
+        'one': '1/minute',
+    },
+}
+
+
+# Caches: 'default' is private to each worker process (throttle histories, slot listings and snapshots),
+# 'shared' holds what every worker has to agree on (replica pins, catalogue versions, locations) and must never
+# evict it, so it is not capped and holds nothing per user but the short-lived pins; `manage.py cleanup_stale_data`
+# deletes the expired entries. 'users' holds per-user copies every worker can use (roles, cart summaries), capped,
+# an evicted copy is only read again. The file caches are shared by the workers of one host and list their
+# directory on every write, point both at Memcached or Redis when workers run on more than one host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'littlelemon-cache',
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+    'users': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'littlelemon-user-cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Delivered orders older than this are moved to the archive tables by `manage.py archive_orders`
+
+ORDER_ARCHIVE_AFTER_DAYS = 90
+
+
+# Background tasks, run by `manage.py run_tasks`
+# a running task whose worker has not finished it after this many seconds is handed to another worker
+
+TASK_LOCK_TIMEOUT = 300
+# tasks that ran successfully are deleted after this many days by `manage.py cleanup_stale_data`
+TASK_RETENTION_DAYS = 7
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+
+# Seconds a worker serves its in-memory featured items before reloading them, even if no menu write was seen;
+# menu writes move a version in the 'shared' cache that makes every worker reload right away
+CATALOGUE_SNAPSHOT_TTL = 60
+
+
+# Response compression, see littlelemon.middleware.CompressionMiddleware
+# encodings in order of preference, br and zstd are used when brotli / zstandard are installed
+
+COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']
+
+COMPRESSION_LEVELS = {
+    'zstd': 3,
+    'br': 4,
+    'gzip': 6,
+}
+
+COMPRESSION_MIN_SIZE = 1024
+
+
+# Hours a stored Idempotency-Key response is replayed for, purged by `manage.py purge_idempotency_keys`
+
+IDEMPOTENCY_KEY_TTL = 24
+
+
+# Seconds the permission classes trust a copy of a user's groups kept in the 'users' cache. Membership
+# changes made through the ORM or the group endpoints invalidate it on commit, changes made in raw SQL wait
+# for it to expire
+
+ROLE_CACHE_TTL = 60
+
+
+# Order time slots: every slot takes ORDER_SLOT_CAPACITY orders. Orders are due within the kitchen's opening hours
+# (local time, [open, close)), whether placed for right away or scheduled up to ORDER_SCHEDULE_DAYS ahead
+
+ORDER_SLOT_MINUTES = 15
+
+ORDER_SLOT_CAPACITY = 20
+
+ORDER_SLOT_HOURS = (11, 22)
+
+ORDER_SCHEDULE_DAYS = 7
+
+# seconds the free places per slot listing is cached, bookings made through this process clear it right away
+ORDER_SLOT_AVAILABILITY_TTL = 30
+
+
+# Carts nothing was added to for this many days are emptied by `manage.py cleanup_stale_data`
+
+ABANDONED_CART_DAYS = 14
+
+# the kitchen feed reports tickets deleted with their order for this many days, screens that were offline for
+# longer reload the full listing
+
+REMOVED_TICKET_RETENTION_DAYS = 2
+
+
+# Request profiling, see littlelemon.middleware.ProfilingMiddleware, off unless PROFILING_ENABLED
+# profiles are listed for managers at /api/profiles, only the newest PROFILING_MAX_FILES are kept
+
+PROFILING_ENABLED = False
+
+PROFILING_PATHS = ['/api/orders']
+
+PROFILING_SAMPLE_RATE = 0.1
+
+PROFILING_SLOW_MS = 500
+
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+PROFILING_MAX_FILES = 100
+
+
+# Locations: requests pick one with the X-Location header or ?location=, DEFAULT_LOCATION otherwise
+# LOCATION_DATABASES maps a location slug to the database alias holding its menu, carts and orders, see
+# api/settings_locations.py
+
+DEFAULT_LOCATION = 'main'
+
+LOCATION_DATABASES = {}
+
+LOCATION_CACHE_TTL = 300
@@ -0,0 +1,48 @@
+"""
+API-only settings for the api project.
+
+Used by workers that only serve token-authenticated JSON traffic under /api/:
+
+    DJANGO_SETTINGS_MODULE=api.settings_api gunicorn api.wsgi
+
+Admin, sessions, messages, static files and the djoser auth endpoints stay on
+workers running the default api.settings profile.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'rest_framework',
+    'rest_framework.authtoken',
+    'littlelemon',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'littlelemon.middleware.CompressionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'littlelemon.middleware.LocationMiddleware',
+    'littlelemon.middleware.ProfilingMiddleware',
+]
+
+ROOT_URLCONF = 'api.urls_api'
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'littlelemon.renderers.ORJSONRenderer',
+        'littlelemon.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'littlelemon.renderers.ORJSONParser',
+        'littlelemon.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+    ],
+}
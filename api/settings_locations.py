@@ -0,0 +1,28 @@
+"""
+Settings for the api project with each location's menu, carts and orders in its own database.
+
+A location database holds the littlelemon, auth and contenttypes tables. Its rows refer to users, locations and
+categories, which are copied over from the default database whenever they change, see littlelemon.replication.
+Copy them once after creating a location database, and after writes that bypass signals. Locally the uptown database
+is a second SQLite file:
+
+    DJANGO_SETTINGS_MODULE=api.settings_locations python manage.py migrate --database uptown
+    DJANGO_SETTINGS_MODULE=api.settings_locations python manage.py sync_locations
+    DJANGO_SETTINGS_MODULE=api.settings_locations python manage.py runserver
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    **DATABASES,  # noqa: F405
+    'uptown': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-uptown.sqlite3',  # noqa: F405
+    },
+}
+
+LOCATION_DATABASES = {
+    'uptown': 'uptown',
+}
+
+DATABASE_ROUTERS = ['littlelemon.routers.LocationShardRouter']
@@ -0,0 +1,33 @@
+"""
+Settings for the api project with reads served from a replica database.
+
+Locally the replica is a second SQLite file; copy db.sqlite3 to db-replica.sqlite3 to
+populate it (replicas are never migrated, they get their schema from the primary):
+
+    DJANGO_SETTINGS_MODULE=api.settings_replica python manage.py runserver
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    **DATABASES,  # noqa: F405
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',  # noqa: F405
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['littlelemon.routers.PrimaryReplicaRouter']
+
+# seconds a client keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = 5
+
+MIDDLEWARE = [
+    'littlelemon.middleware.ReplicaPinningMiddleware',
+    *MIDDLEWARE,  # noqa: F405
+]
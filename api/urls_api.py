@@ -0,0 +1,6 @@
+"""api URL Configuration for the API-only settings profile (api.settings_api)."""
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('littlelemon.urls')),
+]
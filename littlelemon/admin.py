@@ -1,9 +1,10 @@
+from django import forms
 from django.contrib import admin
 from .models import *
 
 
 class MenuItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'price', 'featured', 'category']
+    list_display = ['id', 'title', 'price', 'featured', 'available', 'category']
 
 
 class OrderAdmin(admin.ModelAdmin):
@@ -14,8 +15,35 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['id', 'order', 'menuitem', 'quantity', 'unit_price', 'price']
 
 
+class TimeSlotForm(forms.ModelForm):
+    class Meta:
+        model = TimeSlot
+        fields = ['location', 'start', 'capacity']
+
+    def clean_capacity(self):
+        capacity = self.cleaned_data['capacity']
+        if capacity < 0:
+            raise forms.ValidationError('Capacity can not be negative.')
+        # places are taken by bookings only, compare with the latest count
+        booked = TimeSlot.objects.filter(pk=self.instance.pk).values_list('booked', flat=True).first() or 0
+        if capacity < booked:
+            raise forms.ValidationError('{} places are already booked, capacity can not be lower.'.format(booked))
+        return capacity
+
+
+class TimeSlotAdmin(admin.ModelAdmin):
+    form = TimeSlotForm
+    list_display = ['id', 'start', 'booked', 'capacity']
+    readonly_fields = ['booked']
+
+
+admin.site.register(Location)
 admin.site.register(Category)
 admin.site.register(MenuItem, MenuItemAdmin)
 admin.site.register(Cart)
 admin.site.register(Order, OrderAdmin)
-admin.site.register(OrderItem, OrderItemAdmin)
\ No newline at end of file
+admin.site.register(OrderItem, OrderItemAdmin)
+admin.site.register(ArchivedOrder, OrderAdmin)
+admin.site.register(ArchivedOrderItem, OrderItemAdmin)
+
+admin.site.register(TimeSlot, TimeSlotAdmin)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .locations import at_location, database_locations
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, PreparationTicket
+
+
+def archive_cutoff(days=None) -> datetime.datetime:
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def archive_batch(cutoff: datetime.datetime, batch_size: int) -> int:
+    """Moves up to batch_size delivered orders dated before cutoff into the archive tables of the current location.
+
+    Orders the kitchen still has open preparation tickets for stay until the tickets are done, the done tickets are
+    dropped with their order.
+    """
+    with transaction.atomic(using=router.db_for_write(Order)):
+        orders = list(Order.objects.filter(status=True, date__lt=cutoff)
+                      .exclude(preparationticket__done=False).order_by('id')[:batch_size])
+        if not orders:
+            return 0
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=order.id, user_id=order.user_id, delivery_crew_id=order.delivery_crew_id,
+                          status=order.status, total=order.total, date=order.date, location_id=order.location_id)
+            for order in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(order_id=item.order_id, menuitem_id=item.menuitem_id, quantity=item.quantity,
+                              unit_price=item.unit_price, price=item.price)
+            for item in OrderItem.objects.filter(order__in=orders)
+        ])
+
+        PreparationTicket.objects.filter(order__in=orders).delete()
+        OrderItem.objects.filter(order__in=orders).delete()
+        Order.objects.filter(id__in=[order.id for order in orders]).delete()
+        return len(orders)
+
+
+def archive_orders(days=None, batch_size=500) -> int:
+    """Archives delivered orders older than days in batches, each in its own short transaction.
+
+    Goes through the location databases one by one.
+    """
+    cutoff = archive_cutoff(days)
+    archived = 0
+    for location in database_locations().values():
+        with at_location(location):
+            while True:
+                count = archive_batch(cutoff, batch_size)
+                archived += count
+                if count < batch_size:
+                    break
+    return archived
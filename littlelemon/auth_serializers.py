@@ -0,0 +1,11 @@
+# djoser's serializers live apart from .serializers, so workers on the API-only profile (api.settings_api) never
+# import djoser
+from django.contrib.auth.models import Group
+from djoser.serializers import UserCreateSerializer
+
+
+class LLAPIUserCreateSerializer(UserCreateSerializer):
+    def create(self, validated_data):
+        user = super().create(validated_data)
+        Group.objects.get(name="Customer").user_set.add(user)
+        return user
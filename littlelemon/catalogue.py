@@ -0,0 +1,117 @@
+import datetime
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from .helper_functions import invalidate_cart_summary
+from .models import MenuItem, Cart
+from .serializers import MenuItemSerializer
+
+VERSION_KEY = 'catalogue-version'
+
+# compressed bodies kept across all snapshots, see littlelemon.middleware.CompressionMiddleware
+MAX_COMPRESSED_VARIANTS = 32
+
+# this process' copy of each location's featured items, rebuilt when the shared catalogue version moves on
+_snapshots = {}
+
+# (encoding, body) -> compressed body of a featured or full menu response
+_compressed = {}
+
+
+def version_key(location_id: int = None) -> str:
+    return VERSION_KEY if location_id is None else '{}:{}'.format(VERSION_KEY, location_id)
+
+
+def bump_version(location_id: int = None):
+    """Marks the location's snapshots stale in every process, or every location's without location_id.
+
+    Call after writes that bypass model signals, like QuerySet.update().
+    """
+    caches['shared'].set(version_key(location_id), uuid.uuid4().hex, None)
+    if location_id is None:
+        _snapshots.clear()
+    else:
+        _snapshots.pop(location_id, None)
+
+
+def current_version(location_id: int) -> str:
+    """Combined version of the whole catalogue and of the location's menu, kept in the cache all workers share."""
+    shared = caches['shared']
+    keys = [VERSION_KEY, version_key(location_id)]
+    versions = shared.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            shared.add(key, uuid.uuid4().hex, None)
+            versions[key] = shared.get(key)
+    return '{}/{}'.format(versions[keys[0]], versions[keys[1]])
+
+
+def featured_items(location_id: int) -> list:
+    version = current_version(location_id)
+    ttl = getattr(settings, 'CATALOGUE_SNAPSHOT_TTL', 60)
+    snapshot = _snapshots.get(location_id)
+    if snapshot is None or snapshot['version'] != version or time.monotonic() - snapshot['loaded_at'] > ttl:
+        items = MenuItem.objects.filter(location_id=location_id, featured=True, available=True) \
+            .select_related('category').order_by('id')
+        snapshot = {'version': version, 'loaded_at': time.monotonic(),
+                    'featured': MenuItemSerializer(items, many=True).data}
+        _snapshots[location_id] = snapshot
+        _compressed.clear()
+    return snapshot['featured']
+
+
+def remove_item(item: MenuItem) -> bool:
+    """Deletes item, or only takes it off the menu when past orders refer to it. Returns whether it was deleted.
+
+    An item taken off the menu leaves every cart holding it, like a deleted one, and reorders report it unavailable.
+    """
+    db = item._state.db
+    with transaction.atomic(using=db):
+        try:
+            with transaction.atomic(using=db):
+                item.delete()
+            return True
+        except ProtectedError:
+            pass
+        carts = Cart.objects.using(db).filter(menuitem=item)
+        user_ids = list(carts.values_list('user_id', flat=True))
+        carts.delete()
+        if user_ids:
+            transaction.on_commit(lambda: invalidate_cart_summary(item.location_id, *user_ids), using=db)
+        item.available = False
+        item.featured = False
+        item.save(update_fields=['available', 'featured'])
+    return False
+
+
+def compressed_variant(encoding: str, body: bytes):
+    return _compressed.get((encoding, body))
+
+
+def store_compressed_variant(encoding: str, body: bytes, compressed: bytes):
+    if len(_compressed) >= MAX_COMPRESSED_VARIANTS:
+        _compressed.clear()
+    _compressed[(encoding, body)] = compressed
+
+
+class CatalogueVariantMixin:
+    """Marks a generic view's menu listings so CompressionMiddleware keeps their compressed copies."""
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.catalogue_variant = True
+        return response
+
+
+def daily_special(featured: list, day: datetime.date = None):
+    """The featured items take turns being the special, one per day."""
+    if not featured:
+        return None
+    day = day or timezone.localdate()
+    return featured[day.toordinal() % len(featured)]
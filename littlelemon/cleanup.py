@@ -0,0 +1,108 @@
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .helper_functions import invalidate_cart_summary
+from .models import Cart
+
+
+def delete_in_batches(queryset, batch_size=1000) -> int:
+    """Deletes the rows of queryset batch_size at a time, each batch in its own transaction.
+
+    SQLite locks the whole database for every write, so a single large DELETE would stall all requests until it
+    finished. The ids are read from the primary, a lagging replica would keep handing back deleted rows.
+    """
+    queryset = queryset.using(router.db_for_write(queryset.model))
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic(using=queryset.db):
+            deleted += queryset.filter(pk__in=ids).delete()[0]
+
+
+def purge_abandoned_carts(days=None, batch_size=1000) -> int:
+    """Empties the carts nothing was added to for settings.ABANDONED_CART_DAYS days, batch_size carts at a time.
+
+    A user has a cart at every location, each is abandoned on its own.
+    """
+    if days is None:
+        days = getattr(settings, 'ABANDONED_CART_DAYS', 14)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    db = router.db_for_write(Cart)
+    location_ids = list(Cart.objects.using(db).order_by('location_id').values_list('location_id', flat=True)
+                        .distinct())
+
+    purged = 0
+    for location_id in location_ids:
+        carts = Cart.objects.using(db).filter(location_id=location_id)
+        abandoned = carts.values('user_id').annotate(last_added=Max('created_at')) \
+            .filter(last_added__lt=cutoff).order_by('user_id')
+        while True:
+            user_ids = list(abandoned.values_list('user_id', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            with transaction.atomic(using=db):
+                # lines added since the carts were selected keep their cart alive
+                purged += carts.filter(user_id__in=user_ids, created_at__lt=cutoff).delete()[0]
+            invalidate_cart_summary(location_id, *user_ids)
+    return purged
+
+
+def purge_expired_sessions(batch_size=1000) -> int:
+    """Deletes expired sessions when they are stored in the database."""
+    if not apps.is_installed('django.contrib.sessions') or not settings.SESSION_ENGINE.endswith('db'):
+        return 0
+    from django.contrib.sessions.models import Session
+
+    return delete_in_batches(Session.objects.filter(expire_date__lt=timezone.now()), batch_size)
+
+
+def purge_expired_file_entries(cache: FileBasedCache) -> int:
+    """Deletes the expired files of a file cache, which only deletes them when they are read again."""
+    purged = 0
+    for fname in cache._list_cache_files():
+        try:
+            with open(fname, 'rb') as f:
+                purged += cache._is_expired(f)
+        except FileNotFoundError:
+            pass
+    return purged
+
+
+def purge_expired_cache_entries(batch_size=1000) -> int:
+    """Deletes expired entries of database and file caches.
+
+    Database cache tables hold the throttle histories when that backend is used, the file caches hold replica pins
+    of clients that may never come back. Other cache backends expire entries on their own.
+    """
+    purged = 0
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if isinstance(cache, FileBasedCache):
+            purged += purge_expired_file_entries(cache)
+            continue
+        if not isinstance(cache, DatabaseCache):
+            continue
+        db = router.db_for_write(cache.cache_model_class)
+        connection = connections[db]
+        table = connection.ops.quote_name(cache._table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now().replace(microsecond=0))
+        while True:
+            with transaction.atomic(using=db), connection.cursor() as cursor:
+                cursor.execute('SELECT cache_key FROM {} WHERE expires < %s LIMIT %s'.format(table), [now, batch_size])
+                keys = [row[0] for row in cursor.fetchall()]
+                if not keys:
+                    break
+                cursor.execute('DELETE FROM {} WHERE cache_key IN ({})'.format(table, ', '.join(['%s'] * len(keys))),
+                               keys)
+                purged += cursor.rowcount
+    return purged
@@ -0,0 +1,110 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCodec:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+class BrotliCodec:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self):
+        compressor = brotli.Compressor(quality=self.level)
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+
+
+class ZstdCodec:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return (lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                compressor.flush)
+
+
+CODECS = {
+    'gzip': GzipCodec,
+    'br': BrotliCodec if brotli else None,
+    'zstd': ZstdCodec if zstandard else None,
+}
+
+
+def available_codecs(preference: list, levels: dict) -> dict:
+    """Codecs from preference that can be used in this process, in order of preference."""
+    return {name: CODECS[name](levels[name]) for name in preference if CODECS.get(name)}
+
+
+def compress_stream(codec, chunks):
+    """Compresses a streamed body, flushing after every chunk so the client isn't kept waiting on the buffer."""
+    feed, finish = codec.stream()
+    for chunk in chunks:
+        if chunk:
+            yield feed(chunk)
+    yield finish()
+
+
+async def compress_async_stream(codec, chunks):
+    feed, finish = codec.stream()
+    async for chunk in chunks:
+        if chunk:
+            yield feed(chunk)
+    yield finish()
+
+
+def accepted_encodings(header: str) -> dict:
+    """Encoding -> quality of each entry in an Accept-Encoding header; refused encodings have quality 0."""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate(header: str, codecs: dict):
+    """The preferred (name, codec) the client accepts, or None.
+
+    An encoding listed with q=0 is refused even when a wildcard accepts everything else.
+    """
+    accepted = accepted_encodings(header)
+    for name, codec in codecs.items():
+        if accepted.get(name, accepted.get('*', 0)) > 0:
+            return name, codec
+    return None
@@ -0,0 +1,63 @@
+from rest_framework.exceptions import ParseError
+
+
+def parse_names(query_params, param: str, allowed) -> frozenset | None:
+    if param not in query_params:
+        return None
+    names = frozenset(name.strip() for name in query_params[param].split(',') if name.strip())
+    unknown = sorted(names - set(allowed))
+    if unknown:
+        raise ValueError('{}: unknown field(s) {}, expected any of {}'.format(
+            param, ', '.join('\'{}\''.format(name) for name in unknown), ', '.join(allowed)))
+    return names
+
+
+def sparse_fieldset(query_params, fields, expandable) -> tuple:
+    """Reads ?fields=a,b and ?expand=c, None for a parameter that wasn't given. Raises ValueError for unknown names."""
+    return parse_names(query_params, 'fields', fields), parse_names(query_params, 'expand', expandable)
+
+
+def sparse_queryset(queryset, fields, expand, relations: dict, required=()):
+    """Loads only the columns a sparse fieldset renders and joins only the relations it expands.
+
+    relations maps each expandable relation to the fields its serializer reads. Without fields and expand every
+    relation is joined, matching the full representation. required lists extra columns the caller reads itself.
+    """
+    if fields is None and expand is None:
+        return queryset.select_related(*relations) if relations else queryset
+
+    concrete = {field.name for field in queryset.model._meta.concrete_fields}
+    if fields is None:
+        fields = concrete
+    columns = ['id'] + [name for name in fields if name in concrete] + list(required)
+    joined = [name for name in relations if name in fields and name in (expand or ())]
+    for name in joined:
+        columns += ['{}__{}'.format(name, field) for field in relations[name]]
+    if joined:
+        # select_related() without arguments would follow every foreign key
+        queryset = queryset.select_related(*joined)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetViewMixin:
+    """Applies ?fields= and ?expand= to the queryset and serializer of a GET on a generic view.
+
+    The serializer has to accept fields and expand, see serializers.SparseFieldsMixin.
+    """
+    sparse_relations = {}
+
+    def get_sparse_fieldset(self) -> tuple:
+        if self.request.method != 'GET':
+            return None, None
+        meta = self.get_serializer_class().Meta
+        try:
+            return sparse_fieldset(self.request.query_params, meta.fields, meta.expandable)
+        except ValueError as e:
+            raise ParseError(str(e))
+
+    def get_queryset(self):
+        return sparse_queryset(super().get_queryset(), *self.get_sparse_fieldset(), self.sparse_relations)
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_fieldset()
+        return super().get_serializer(*args, fields=fields, expand=expand, **kwargs)
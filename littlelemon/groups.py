@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User, Group
+from django.db import transaction
+from django.db.models import Q
+
+from .helper_functions import list_param
+from .roles import invalidate_roles
+
+Membership = User.groups.through
+
+
+def user_identifiers(data) -> tuple:
+    """User ids and usernames from the id/ids and username/usernames fields. Raises ValueError for a bad id."""
+    ids = [int(value) for value in list_param(data, 'id') + list_param(data, 'ids')]
+    usernames = [str(value) for value in list_param(data, 'username') + list_param(data, 'usernames')]
+    return ids, usernames
+
+
+def find_users(ids: list, usernames: list) -> tuple:
+    """Looks up all users in one query and returns them with the identifiers that matched nobody."""
+    users = list(User.objects.filter(Q(id__in=ids) | Q(username__in=usernames)).order_by('id'))
+    found_ids = {user.id for user in users}
+    found_usernames = {user.username for user in users}
+    missing = [value for value in ids if value not in found_ids] \
+        + [value for value in usernames if value not in found_usernames]
+    return users, missing
+
+
+def add_to_group(group: Group, users: list):
+    with transaction.atomic():
+        Membership.objects.bulk_create([Membership(user_id=user.id, group_id=group.id) for user in users],
+                                       ignore_conflicts=True)
+        transaction.on_commit(lambda: invalidate_roles(*[user.id for user in users]))
+
+
+def remove_from_group(group: Group, users: list) -> int:
+    with transaction.atomic():
+        removed, _ = Membership.objects.filter(group=group, user_id__in=[user.id for user in users]).delete()
+        transaction.on_commit(lambda: invalidate_roles(*[user.id for user in users]))
+    return removed
@@ -1,14 +1,84 @@
-from .models import Order, OrderItem
-from .serializers import OrderItemSerializer
+from django.core.cache import caches
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 
+from .fieldsets import sparse_queryset
+from .models import Cart, Order, ArchivedOrder
+from .money import from_cents
+from .serializers import OrderSerializer, OrderItemSerializer, ArchivedOrderSerializer, ArchivedOrderItemSerializer, \
+    UserSerializer
 
-def build_order_item_list(order: Order) -> list(dict()):
+
+# order fields a client can pick with ?fields=, orderitems comes from build_order_item_list
+ORDER_FIELDS = OrderSerializer.Meta.fields + ['orderitems']
+
+
+def list_param(data, name: str) -> list:
+    if hasattr(data, 'getlist'):
+        return data.getlist(name)
+    value = data.get(name, [])
+    return value if isinstance(value, list) else [value]
+
+
+def id_list(data, name: str) -> list:
+    """Ids from a JSON list, repeated form fields or comma separated values. Raises ValueError for anything else."""
+    ids = []
+    for value in list_param(data, name):
+        if type(value) is int:
+            ids.append(value)
+            continue
+        if type(value) is not str:
+            raise ValueError('{}: expected a list of ids'.format(name))
+        ids += [int(part) for part in value.split(',') if part.strip()]
+    return ids
+
+
+def serialize_order(order: Order | ArchivedOrder, fields=None, expand=None) -> dict:
+    if isinstance(order, ArchivedOrder):
+        return ArchivedOrderSerializer(order, fields=fields, expand=expand).data
+    return OrderSerializer(order, fields=fields, expand=expand).data
+
+
+def order_representation(order: Order | ArchivedOrder, fields=None, expand=None, crew_field='username') -> dict:
+    """serialize_order plus the order items. The full representation shows the crew member's crew_field."""
+    output = serialize_order(order, fields, expand)
+    if fields is None and expand is None and output['delivery_crew']:
+        output['delivery_crew'] = output['delivery_crew'][crew_field]
+    if fields is None or 'orderitems' in fields:
+        output['orderitems'] = build_order_item_list(order)
+    return output
+
+
+def with_order_details(orders, fields=None, expand=None, with_user=False):
+    """Loads everything order_representation reads in two extra queries, however many orders.
+
+    fields and expand trim the columns, joins and prefetches to what the sparse fieldset renders, with_user also
+    joins the customer.
+    """
+    if fields is None or 'orderitems' in fields:
+        items = 'archivedorderitem_set' if orders.model is ArchivedOrder else 'orderitem_set'
+        orders = orders.prefetch_related(items)
+    # views check the order's owner
+    required = ['user']
+    if with_user:
+        orders = orders.select_related('user')
+        required += ['user__{}'.format(field) for field in UserSerializer.Meta.fields]
+    return sparse_queryset(orders, fields, expand, {'delivery_crew': UserSerializer.Meta.fields},
+                           required).order_by('id')
+
+
+def build_order_item_list(order: Order | ArchivedOrder) -> list(dict()):
     out = []
 
-    order_items = OrderItem.objects.filter(order=order)
+    if isinstance(order, ArchivedOrder):
+        order_items = order.archivedorderitem_set.all()
+        item_serializer = ArchivedOrderItemSerializer
+    else:
+        order_items = order.orderitem_set.all()
+        item_serializer = OrderItemSerializer
     for item in order_items:
         item_info = {}
-        s_item = OrderItemSerializer(item)
+        s_item = item_serializer(item)
 
         item_info['id'] = s_item.data['menuitem']
         item_info['quantity'] = s_item.data['quantity']
@@ -52,3 +122,30 @@ def is_null_string(string: str, empty_string=True) -> bool:
         if possible_null == '':
             return True
     return False
+
+
+# bounds staleness after cart writes that bypass invalidate_cart_summary
+CART_SUMMARY_TIMEOUT = 300
+
+
+def cart_summary_key(location_id: int, user_id: int) -> str:
+    return 'cart-summary:{}:{}'.format(location_id, user_id)
+
+
+def cart_summary(location_id: int, user_id: int) -> dict:
+    """Line count, item count and subtotal of a user's cart at a location, cached until the cart changes.
+
+    Kept in the per-user cache every worker shares, so a cart write invalidates it for all of them.
+    """
+    users = caches['users']
+    summary = users.get(cart_summary_key(location_id, user_id))
+    if summary is None:
+        totals = Cart.objects.filter(location_id=location_id, user_id=user_id).aggregate(
+            lines=Count('id'), items=Coalesce(Sum('quantity'), 0), subtotal=Coalesce(Sum('price'), 0))
+        summary = {'lines': totals['lines'], 'items': totals['items'], 'subtotal': from_cents(totals['subtotal'])}
+        users.set(cart_summary_key(location_id, user_id), summary, CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart_summary(location_id: int, *user_ids: int):
+    caches['users'].delete_many([cart_summary_key(location_id, user_id) for user_id in user_ids])
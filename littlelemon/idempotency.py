@@ -0,0 +1,80 @@
+import datetime
+import hashlib
+from functools import wraps
+
+import orjson
+from django.conf import settings
+from django.db import router, transaction
+from django.db.utils import IntegrityError
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .cleanup import delete_in_batches
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def request_hash(request) -> str:
+    body = orjson.dumps(request.data, default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(request.method.encode() + b' ' + request.path.encode() + b' ' + body).hexdigest()
+
+
+def expiry_cutoff():
+    """Keys created before this are expired, see settings.IDEMPOTENCY_KEY_TTL."""
+    return timezone.now() - datetime.timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24))
+
+
+def replay(record, digest):
+    if record.request_hash != digest:
+        return Response({'error': '{} was already used for a different request'.format(HEADER)}, status=422)
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """Replays the stored response when a POST is retried with the same Idempotency-Key header.
+
+    The key is stored in the same transaction as the view's writes, which all go to the location's database, so a
+    retry that races the original request waits for it and then replays its response instead of running the view
+    a second time. Expired keys are reused as if purge_expired had already removed them, and nothing is stored when
+    the view fails with a 5xx or leaves the transaction broken by a database error.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': '{}: expected at most 255 characters'.format(HEADER)}, status=400)
+
+        digest = request_hash(request)
+        db = router.db_for_write(IdempotencyKey)
+        with transaction.atomic(using=db):
+            try:
+                with transaction.atomic(using=db):
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=digest)
+            except IntegrityError:
+                record = IdempotencyKey.objects.select_for_update().get(user=request.user, key=key)
+                if record.created_at >= expiry_cutoff():
+                    return replay(record, digest)
+                record.created_at = timezone.now()
+                record.request_hash = digest
+                record.save(update_fields=['created_at', 'request_hash'])
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code >= 500 or transaction.get_rollback(using=db):
+                transaction.set_rollback(True, using=db)
+                return response
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response'])
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000) -> int:
+    """Deletes keys older than settings.IDEMPOTENCY_KEY_TTL hours, batch_size rows per transaction."""
+    return delete_in_batches(IdempotencyKey.objects.filter(created_at__lt=expiry_cutoff()), batch_size)
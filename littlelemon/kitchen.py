@@ -0,0 +1,98 @@
+import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cleanup import delete_in_batches
+from .models import PreparationTicket, RemovedTicket, Sequence
+
+FEED = 'preparation-tickets'
+
+
+def next_positions(count: int) -> int:
+    """Reserves count consecutive kitchen feed positions and returns the first.
+
+    The counter row stays locked until the surrounding transaction commits, so ticket changes commit in position
+    order and a feed reader's cursor can't move past a position that has yet to commit. Timestamps give no such
+    guarantee, a transaction that commits late carries the time it started writing. Every transaction calling this
+    runs one at a time, keep them short: checkouts leave their tickets to place_tickets.
+    """
+    db = router.db_for_write(PreparationTicket)
+    counter = Sequence.objects.using(db).filter(name=FEED)
+    with transaction.atomic(using=db, savepoint=False):
+        if not counter.update(value=F('value') + count):
+            Sequence.objects.using(db).create(name=FEED, value=count)
+        return counter.values_list('value', flat=True).get() - count + 1
+
+
+def last_position() -> int:
+    """The newest position of a committed change."""
+    db = router.db_for_read(PreparationTicket)
+    return Sequence.objects.using(db).filter(name=FEED).values_list('value', flat=True).first() or 0
+
+
+def create_tickets(order, lines) -> list:
+    """One preparation ticket per cart line of a new order, placed in the feed once the order commits."""
+    db = router.db_for_write(PreparationTicket)
+    tickets = PreparationTicket.objects.using(db).bulk_create([
+        PreparationTicket(order=order, menuitem_id=line.menuitem_id, quantity=line.quantity,
+                          location_id=order.location_id)
+        for line in lines
+    ])
+    transaction.on_commit(place_tickets, using=db)
+    return tickets
+
+
+def place_tickets(batch_size=1000) -> int:
+    """Gives the tickets still without a feed position one, in a transaction of its own.
+
+    Reserving positions inside a checkout would hold the counter for the whole checkout and make checkouts wait for
+    each other. Tickets of a checkout whose process stopped before placing them are placed by the next one.
+    """
+    db = router.db_for_write(PreparationTicket)
+    with transaction.atomic(using=db):
+        unplaced = PreparationTicket.objects.using(db).filter(position__isnull=True)
+        ids = list(unplaced.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        # ids are close to consecutive, the positions of the ids in between go unused
+        first = next_positions(ids[-1] - ids[0] + 1)
+        return unplaced.filter(id__in=ids).update(position=F('id') + (first - ids[0]))
+
+
+def set_done(ticket: PreparationTicket, done: bool):
+    with transaction.atomic(using=router.db_for_write(PreparationTicket)):
+        ticket.done = done
+        ticket.position = next_positions(1)
+        ticket.save(update_fields=['done', 'position', 'updated_at'])
+
+
+def remove_tickets(orders) -> int:
+    """Deletes the tickets of orders and puts a RemovedTicket in the feed for each, call before deleting orders.
+
+    Deleting the orders alone would take their tickets along without a trace in the feed, kitchen screens following
+    it would keep showing them.
+    """
+    db = router.db_for_write(PreparationTicket)
+    with transaction.atomic(using=db):
+        tickets = list(PreparationTicket.objects.using(db).filter(order__in=orders).order_by('id')
+                       .values_list('id', 'location_id'))
+        if not tickets:
+            return 0
+        first = next_positions(len(tickets))
+        RemovedTicket.objects.using(db).bulk_create([
+            RemovedTicket(ticket_id=ticket_id, location_id=location_id, position=first + n)
+            for n, (ticket_id, location_id) in enumerate(tickets)
+        ])
+        PreparationTicket.objects.using(db).filter(id__in=[ticket_id for ticket_id, _ in tickets]).delete()
+    return len(tickets)
+
+
+def purge_removed_tickets(days=None, batch_size=1000) -> int:
+    """Deletes the RemovedTicket rows older than settings.REMOVED_TICKET_RETENTION_DAYS days."""
+    if days is None:
+        days = getattr(settings, 'REMOVED_TICKET_RETENTION_DAYS', 2)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    return delete_in_batches(RemovedTicket.objects.filter(removed_at__lt=cutoff), batch_size)
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Location
+from .routers import current_location, location_db
+
+HEADER = 'X-Location'
+
+LOCATIONS_KEY = 'locations'
+
+
+def default_slug() -> str:
+    return getattr(settings, 'DEFAULT_LOCATION', 'main')
+
+
+def locations() -> dict:
+    """Every location by slug, cached for settings.LOCATION_CACHE_TTL seconds or until a location changes.
+
+    Migration 0009 creates the default location, it is created again if it was deleted since.
+    """
+    by_slug = caches['shared'].get(LOCATIONS_KEY)
+    if by_slug is None:
+        by_slug = {location.slug: location for location in Location.objects.all()}
+        if default_slug() not in by_slug:
+            by_slug[default_slug()] = Location.objects.get_or_create(slug=default_slug(),
+                                                                     defaults={'name': 'Little Lemon'})[0]
+        caches['shared'].set(LOCATIONS_KEY, by_slug, getattr(settings, 'LOCATION_CACHE_TTL', 300))
+    return by_slug
+
+
+def invalidate_locations():
+    caches['shared'].delete(LOCATIONS_KEY)
+
+
+def get_location(slug: str = None) -> Location | None:
+    """The location with slug, the default location when slug is empty."""
+    return locations().get(slug or default_slug())
+
+
+def order_db() -> str:
+    return location_db(current_location.get())
+
+
+def order_transaction():
+    """The transaction of a checkout, every table it writes lives in the current location's database."""
+    return transaction.atomic(using=order_db())
+
+
+def database_locations() -> dict:
+    """One location per database holding location data, by alias, the default location for the default database.
+
+    Jobs that go through every location database run once at each of these.
+    """
+    by_db = {}
+    for location in sorted(locations().values(), key=lambda location: location.slug != default_slug()):
+        by_db.setdefault(location_db(location), location)
+    return by_db
+
+
+@contextmanager
+def at_location(location: Location):
+    """Runs the block for location, so the order tables are read from and written to its database."""
+    token = current_location.set(location)
+    try:
+        yield location
+    finally:
+        current_location.reset(token)
+
+
+class LocationScopedViewMixin:
+    """Limits a generic view's queryset to the rows of the request's location."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(location=self.request.location)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from littlelemon.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered orders older than ORDER_ARCHIVE_AFTER_DAYS into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='archive delivered orders older than this many days')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        archived = archive_orders(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write('archived {} orders'.format(archived))
@@ -0,0 +1,74 @@
+import datetime
+import time
+
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from littlelemon.archive import archive_orders
+from littlelemon.locations import get_location
+from littlelemon.models import MenuItem, Order, OrderItem
+from littlelemon.views import OrdersView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time a customer\'s order listing before and after archiving their delivered orders. ' \
+           'Seeded rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='delivered orders older than the archive age')
+        parser.add_argument('--recent', type=int, default=20, help='open orders that stay in the hot tables')
+        parser.add_argument('--items', type=int, default=3, help='order items per order')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        customer = User.objects.create(username='benchmark-archive-customer')
+        Group.objects.get_or_create(name='Customer')[0].user_set.add(customer)
+        menuitems = list(MenuItem.objects.all()[:options['items']])
+        if len(menuitems) < options['items']:
+            self.stderr.write('need at least {} menu items to seed orders'.format(options['items']))
+            return
+
+        old = timezone.now() - datetime.timedelta(days=365)
+        location = get_location(None)
+        orders = Order.objects.bulk_create(
+            [Order(user=customer, status=True, total=0, date=old, location=location) for _ in range(options['orders'])]
+            + [Order(user=customer, status=False, total=0, date=timezone.now(), location=location)
+               for _ in range(options['recent'])])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+            for order in orders for menuitem in menuitems
+        ])
+
+        self.stdout.write('before: {}'.format(self.time_listing(customer, options['runs'])))
+        start = time.perf_counter()
+        archived = archive_orders()
+        self.stdout.write('archived {} orders in {:.3f} s'.format(archived, time.perf_counter() - start))
+        self.stdout.write('after:  {}'.format(self.time_listing(customer, options['runs'])))
+
+    @staticmethod
+    def time_listing(customer, runs):
+        view = OrdersView.as_view(throttle_classes=[])
+        request = APIRequestFactory().get('/api/orders')
+        request.location = get_location(None)
+        force_authenticate(request, user=customer)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - start)
+        return '{} orders listed in {:.1f} ms (best of {})'.format(len(response.data), min(timings) * 1000, runs)
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+
+from littlelemon.compression import available_codecs
+from littlelemon.renderers import ORJSONRenderer
+from . import benchmark_renderers
+
+
+class Command(benchmark_renderers.Command):
+    help = 'Measure CPU time against bytes saved for each available response encoding and level ' \
+           'on the manager order listing and the menu. Seeded rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--levels', type=int, nargs='+', default=[1, 3, 6, 9])
+
+    def measure(self, payloads, options):
+        encodings = getattr(settings, 'COMPRESSION_ENCODINGS', ['gzip'])
+        for name, data in payloads:
+            body = ORJSONRenderer().render(data)
+            self.stdout.write('{}: {} bytes'.format(name, len(body)))
+            for level in options['levels']:
+                for encoding, codec in available_codecs(encodings, {e: level for e in encodings}).items():
+                    timings = []
+                    for _ in range(options['runs']):
+                        start = time.perf_counter()
+                        compressed = codec.compress(body)
+                        timings.append(time.perf_counter() - start)
+                    self.stdout.write('    {:<5} level {:<2} {:8.2f} ms  {:>9} bytes  {:5.1f}% saved'.format(
+                        encoding, level, min(timings) * 1000, len(compressed),
+                        100 - 100 * len(compressed) / len(body)))
@@ -0,0 +1,76 @@
+import time
+
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from littlelemon.locations import get_location
+from littlelemon.models import MenuItem, Order, OrderItem
+from littlelemon.renderers import ORJSONRenderer, MessagePackRenderer
+from littlelemon.views import OrdersView, MenuItemsListView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare render time and payload size of the JSON, orjson and MessagePack renderers ' \
+           'on the manager order listing and the menu. Seeded rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=20, help='orders per customer')
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        manager = User.objects.create(username='benchmark-renderers-manager')
+        Group.objects.get_or_create(name='Manager')[0].user_set.add(manager)
+        customers = User.objects.bulk_create([
+            User(username='benchmark-renderers-{}'.format(i)) for i in range(options['customers'])
+        ])
+        menuitems = list(MenuItem.objects.all()[:3])
+        orders = Order.objects.bulk_create([
+            Order(user=customer, total=0, date=timezone.now(), location=get_location(None))
+            for customer in customers for _ in range(options['orders'])
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+            for order in orders for menuitem in menuitems
+        ])
+
+        payloads = [
+            ('manager orders', self.response_data(OrdersView, '/api/orders', manager)),
+            ('menu', self.response_data(MenuItemsListView, '/api/menu-items', manager)),
+        ]
+        self.measure(payloads, options)
+
+    def measure(self, payloads, options):
+        for name, data in payloads:
+            self.stdout.write(name)
+            for renderer in (JSONRenderer(), ORJSONRenderer(), MessagePackRenderer()):
+                timings = []
+                for _ in range(options['runs']):
+                    start = time.perf_counter()
+                    body = renderer.render(data, renderer.media_type, {})
+                    timings.append(time.perf_counter() - start)
+                self.stdout.write('    {:<22} {:8.2f} ms  {:>9} bytes'.format(
+                    type(renderer).__name__, min(timings) * 1000, len(body)))
+
+    @staticmethod
+    def response_data(view_class, path, user):
+        request = APIRequestFactory().get(path)
+        request.location = get_location(None)
+        force_authenticate(request, user=user)
+        return view_class.as_view(throttle_classes=[])(request).data
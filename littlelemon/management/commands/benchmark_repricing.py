@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from littlelemon.locations import get_location
+from littlelemon.models import Category, MenuItem, Cart
+from littlelemon.pricing import reprice_menu
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row and set-based repricing of cart lines. Seeded rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=100000)
+        parser.add_argument('--menu-items', type=int, default=10)
+        parser.add_argument('--per-row-sample', type=int, default=5000,
+                            help='cart lines repriced one save() at a time, scaled up to --carts')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        category = Category.objects.create(slug='benchmark-repricing', title='Benchmark repricing')
+        location = get_location(None)
+        menuitems = MenuItem.objects.bulk_create([
+            MenuItem(title='Benchmark item {}'.format(i), price=500 + i, category=category, location=location)
+            for i in range(options['menu_items'])
+        ])
+        users = User.objects.bulk_create([
+            User(username='benchmark-repricing-{}'.format(i))
+            for i in range(-(-options['carts'] // len(menuitems)))
+        ], batch_size=1000)
+        Cart.objects.bulk_create([
+            Cart(user=user, menuitem=menuitem, quantity=2, unit_price=menuitem.price, price=2 * menuitem.price,
+                 location=location)
+            for user in users for menuitem in menuitems
+        ][:options['carts']], batch_size=1000)
+        self.stdout.write('seeded {} cart lines'.format(Cart.objects.filter(menuitem__category=category).count()))
+
+        sample = options['per_row_sample']
+        start = time.perf_counter()
+        for cart in Cart.objects.filter(menuitem__category=category).select_related('menuitem')[:sample]:
+            cart.unit_price = cart.menuitem.price + 10
+            cart.price = cart.quantity * cart.unit_price
+            cart.save()
+        elapsed = time.perf_counter() - start
+        self.stdout.write('per-row:   {} lines in {:.3f} s, ~{:.1f} s for {}'.format(
+            sample, elapsed, elapsed * options['carts'] / sample, options['carts']))
+
+        start = time.perf_counter()
+        items, carts = reprice_menu(MenuItem.objects.filter(category=category), 1000)
+        self.stdout.write('set-based: {} menu items and {} lines in {:.3f} s'.format(
+            items, carts, time.perf_counter() - start))
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# run in a fresh interpreter so nothing is already imported or allocated
+WORKER_STARTUP = '''
+import resource, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from api.wsgi import application
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start import time and per-worker memory for each settings profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['api.settings', 'api.settings_api'])
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--slowest', type=int, default=0,
+                            help='also list the n slowest imports (cumulative) of the last run')
+
+    def handle(self, *args, **options):
+        for profile in options['profiles']:
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile)
+            startups, rss = [], []
+            for _ in range(options['runs']):
+                result = subprocess.run([sys.executable, '-X', 'importtime', '-c', WORKER_STARTUP],
+                                        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+                seconds, maxrss = result.stdout.split()
+                startups.append(float(seconds))
+                rss.append(int(maxrss))
+
+            imports = [line.split('|') for line in result.stderr.splitlines()
+                       if line.startswith('import time:') and not line.endswith('imported package')]
+            imports = [(int(cumulative), name.rstrip()) for _, cumulative, name in imports]
+
+            self.stdout.write('{:<20} startup {:7.1f} ms (best of {})  rss {:6.1f} MB  modules {}'.format(
+                profile, min(startups) * 1000, options['runs'], min(rss) / 1024, len(imports)))
+            for cumulative, name in sorted(imports, reverse=True)[:options['slowest']]:
+                self.stdout.write('    {:8.1f} ms  {}'.format(cumulative / 1000, name))
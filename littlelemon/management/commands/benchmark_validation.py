@@ -0,0 +1,36 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from littlelemon.serializers import MenuItemSerializer
+
+
+def legacy_validate(data):
+    import bleach
+    return {'price': Decimal(bleach.clean(data['price'])), 'title': bleach.clean(data['title'])}
+
+
+class Command(BaseCommand):
+    help = 'Measure menu item validation throughput for a bulk write of menu items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000)
+        parser.add_argument('--markup-every', type=int, default=100,
+                            help='every n-th title contains markup and takes the bleach path')
+
+    def handle(self, *args, **options):
+        payloads = []
+        for i in range(options['items']):
+            title = 'Menu item {}'.format(i)
+            if options['markup_every'] and i % options['markup_every'] == 0:
+                title = '<b>{}</b>'.format(title)
+            payloads.append({'title': title, 'price': '{}.{:02d}'.format(i % 75, i % 100)})
+
+        for name, validate in (('bleach', legacy_validate), ('sanitize', MenuItemSerializer.validate_partial_data)):
+            start = time.perf_counter()
+            for data in payloads:
+                validate(data)
+            elapsed = time.perf_counter() - start
+            self.stdout.write('{:<10} {:>8} items  {:8.3f} s  {:>10.0f} items/s'.format(
+                name, len(payloads), elapsed, len(payloads) / elapsed))
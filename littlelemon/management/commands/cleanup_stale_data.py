@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from littlelemon.cleanup import purge_abandoned_carts, purge_expired_sessions, purge_expired_cache_entries
+from littlelemon.idempotency import purge_expired
+from littlelemon.kitchen import purge_removed_tickets
+from littlelemon.locations import at_location, database_locations
+from littlelemon.taskqueue import purge_finished
+
+
+class Command(BaseCommand):
+    help = ('Delete abandoned carts, finished tasks, removed kitchen tickets and expired idempotency keys, sessions '
+            'and database cache entries in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cart-days', type=int, default=None,
+                            help='empty carts nothing was added to for this many days')
+        parser.add_argument('--task-days', type=int, default=None,
+                            help='delete tasks that finished successfully more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        jobs = [
+            # carts, idempotency keys, tasks and removed tickets live in every location database
+            ('cart lines', lambda: self.everywhere(purge_abandoned_carts, days=options['cart_days'],
+                                                   batch_size=batch_size)),
+            ('idempotency keys', lambda: self.everywhere(purge_expired, batch_size=batch_size)),
+            ('finished tasks', lambda: self.everywhere(purge_finished, days=options['task_days'],
+                                                       batch_size=batch_size)),
+            ('removed tickets', lambda: self.everywhere(purge_removed_tickets, batch_size=batch_size)),
+            ('sessions', lambda: purge_expired_sessions(batch_size=batch_size)),
+            ('cache entries', lambda: purge_expired_cache_entries(batch_size=batch_size)),
+        ]
+
+        total = 0
+        for name, job in jobs:
+            start = time.perf_counter()
+            rows = job()
+            total += rows
+            self.stdout.write('{:>16}: {:>8} rows in {:.2f}s'.format(name, rows, time.perf_counter() - start))
+        self.stdout.write('reclaimed {} rows'.format(total))
+
+    def everywhere(self, job, **kwargs) -> int:
+        rows = 0
+        for location in database_locations().values():
+            with at_location(location):
+                rows += job(**kwargs)
+        return rows
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from littlelemon.idempotency import purge_expired
+from littlelemon.locations import at_location, database_locations
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL hours.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        purged = 0
+        for location in database_locations().values():
+            with at_location(location):
+                purged += purge_expired(batch_size=options['batch_size'])
+        self.stdout.write('purged {} idempotency keys'.format(purged))
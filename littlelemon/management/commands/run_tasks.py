@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+import littlelemon.tasks  # noqa: F401 registers the task handlers
+from littlelemon.locations import at_location, database_locations
+from littlelemon.taskqueue import run_batch
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks of every location database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=1.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            claimed = 0
+            for location in database_locations().values():
+                with at_location(location):
+                    claimed += run_batch(options['batch_size'])
+            processed += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write('ran {} tasks'.format(processed))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from littlelemon.replication import replicate_all
+from littlelemon.routers import location_databases
+
+
+class Command(BaseCommand):
+    help = ('Copy the users, locations and categories to every location database, and delete copies of rows the '
+            'default database no longer has.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        copied = replicate_all(batch_size=options['batch_size'])
+        self.stdout.write('copied {} rows to {} location databases'.format(copied, len(location_databases())))
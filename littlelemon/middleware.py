@@ -0,0 +1,196 @@
+import cProfile
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import catalogue
+from .compression import available_codecs, compress_async_stream, compress_stream, negotiate
+from .locations import HEADER as LOCATION_HEADER, at_location, get_location
+from .permissions import IsManager
+from .profiling import HEADER as PROFILE_HEADER, save_profile
+from .routers import use_primary
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware:
+    """Lets safe requests read from a replica, except during and shortly after a request of the same client that writes.
+
+    Clients are told apart by their Authorization header or session cookie, and the pin is kept in the shared
+    cache for settings.REPLICA_PIN_SECONDS so that a client reads its own writes on every worker while replicas
+    catch up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        client = self.client_key(request)
+        pin_key = 'replica-pin:' + client if client else None
+        write = request.method not in SAFE_METHODS
+
+        pins = caches['shared']
+        token = use_primary.set(write or bool(pin_key and pins.get(pin_key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+
+        if write and pin_key:
+            pins.set(pin_key, True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        return response
+
+    @staticmethod
+    def client_key(request):
+        credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credentials:
+            return None
+        return hashlib.sha256(credentials.encode()).hexdigest()
+
+
+class LocationMiddleware:
+    """Sets request.location from the X-Location header or ?location= parameter, the default location otherwise.
+
+    The location stays current while the view runs, so order tables go to its database, see
+    littlelemon.routers.LocationShardRouter.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slug = request.headers.get(LOCATION_HEADER) or request.GET.get('location')
+        location = get_location(slug)
+        if location is None:
+            return JsonResponse({'error': 'location \'{}\' not found'.format(slug)}, status=404)
+
+        request.location = location
+        with at_location(location):
+            response = self.get_response(request)
+        patch_vary_headers(response, (LOCATION_HEADER,))
+        return response
+
+
+class CompressionMiddleware:
+    """Compresses responses with the best encoding both sides support.
+
+    Responses smaller than settings.COMPRESSION_MIN_SIZE are sent as they are, streamed responses (sync or async)
+    are compressed chunk by chunk, and responses marked with catalogue_variant reuse the catalogue's compressed
+    copy of the body. HTML pages, like the browsable API's, and responses carrying the CSRF token are never
+    compressed: they reflect request input next to a secret, which lets BREACH recover the secret from the
+    compressed size.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = available_codecs(getattr(settings, 'COMPRESSION_ENCODINGS', ['gzip']),
+                                       getattr(settings, 'COMPRESSION_LEVELS', {'gzip': 6}))
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or self.carries_secrets(request, response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        negotiated = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.codecs)
+        if negotiated is None:
+            return response
+        encoding, codec = negotiated
+
+        if response.streaming:
+            # StreamingHttpResponse can stream from an async iterator since Django 4.2
+            if getattr(response, 'is_async', False):
+                response.streaming_content = compress_async_stream(codec, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(codec, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = self.compress(response, encoding, codec)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def carries_secrets(request, response) -> bool:
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type == 'text/html' or bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE'))
+
+    @staticmethod
+    def compress(response, encoding, codec) -> bytes:
+        if not getattr(response, 'catalogue_variant', False):
+            return codec.compress(response.content)
+
+        compressed = catalogue.compressed_variant(encoding, response.content)
+        if compressed is None:
+            compressed = codec.compress(response.content)
+            catalogue.store_compressed_variant(encoding, response.content, compressed)
+        return compressed
+
+
+class ProfilingMiddleware:
+    """Runs a sample of requests under cProfile and keeps the profiles of the slow ones.
+
+    Requests under settings.PROFILING_PATHS are profiled at PROFILING_SAMPLE_RATE, and a sampled profile is stored
+    when the request took PROFILING_SLOW_MS or longer. A manager can ask for a profile with an X-Profile header,
+    the request is then always profiled and stored and the profile's name comes back in the same header. The
+    header is ignored for everyone else. Unless PROFILING_ENABLED is set the middleware removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, 'PROFILING_PATHS', ['/api/orders']))
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1)
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 500)
+
+    def __call__(self, request):
+        if not request.path.startswith(self.paths):
+            return self.get_response(request)
+        requested = PROFILE_HEADER in request.headers and self.from_manager(request)
+        if not (requested or random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+
+        if requested or elapsed_ms >= self.slow_ms:
+            name = save_profile(profiler, request.method, request.path, elapsed_ms)
+            if requested:
+                response.headers[PROFILE_HEADER] = name
+        return response
+
+    @staticmethod
+    def from_manager(request) -> bool:
+        """Authenticates the request the way the API views will, before the view runs."""
+        authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            return IsManager().has_permission(Request(request, authenticators=authenticators), None)
+        except APIException:
+            # bad credentials, or a session without its CSRF token
+            return False
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+import littlelemon.money
+
+MONEY_FIELDS = [
+    ('menuitem', 'price', True),
+    ('cart', 'unit_price', True),
+    ('cart', 'price', True),
+    ('order', 'total', False),
+    ('orderitem', 'unit_price', False),
+    ('orderitem', 'price', False),
+]
+
+
+def decimal_to_cents(apps, schema_editor):
+    for model_name, field, _ in MONEY_FIELDS:
+        model = apps.get_model('littlelemon', model_name)
+        rows = list(model.objects.only('id', field))
+        for row in rows:
+            value = getattr(row, field)
+            setattr(row, field + '_cents', int((Decimal(value or 0) * 100).quantize(Decimal(1))))
+        model.objects.bulk_update(rows, [field + '_cents'], batch_size=500)
+
+
+def cents_to_decimal(apps, schema_editor):
+    for model_name, field, _ in MONEY_FIELDS:
+        model = apps.get_model('littlelemon', model_name)
+        rows = list(model.objects.only('id', field + '_cents'))
+        for row in rows:
+            setattr(row, field, Decimal(getattr(row, field + '_cents')) / 100)
+        model.objects.bulk_update(rows, [field], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(model_name=model_name, name=field + '_cents',
+                            field=littlelemon.money.MoneyField(default=0))
+        for model_name, field, _ in MONEY_FIELDS
+    ] + [
+        migrations.RunPython(decimal_to_cents, cents_to_decimal),
+    ] + [
+        # unapplying RemoveField adds the decimal column back to tables that have rows, cents_to_decimal then
+        # overwrites the default with the real amount
+        migrations.AlterField(model_name=model_name, name=field,
+                              field=models.DecimalField(db_index=db_index, decimal_places=2, max_digits=6, default=0))
+        for model_name, field, db_index in MONEY_FIELDS
+    ] + [
+        migrations.RemoveField(model_name=model_name, name=field)
+        for model_name, field, _ in MONEY_FIELDS
+    ] + [
+        migrations.RenameField(model_name=model_name, old_name=field + '_cents', new_name=field)
+        for model_name, field, _ in MONEY_FIELDS
+    ] + [
+        migrations.AlterField(model_name=model_name, name=field,
+                              field=littlelemon.money.MoneyField(db_index=db_index))
+        for model_name, field, db_index in MONEY_FIELDS
+    ]
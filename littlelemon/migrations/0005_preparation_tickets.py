@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0004_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreparationTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.SmallIntegerField()),
+                ('done', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='littlelemon.menuitem')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='littlelemon.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['done', 'menuitem', 'quantity'], name='littlelemon_done_7087b6_idx')],
+            },
+        ),
+    ]
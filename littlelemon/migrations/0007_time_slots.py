@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:21
+
+import django
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0006_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(unique=True)),
+                ('capacity', models.SmallIntegerField()),
+                ('booked', models.SmallIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(**{'condition' if django.VERSION >= (5, 1) else 'check': models.Q(('booked__lte', models.F('capacity')))}, name='timeslot_booked_within_capacity')],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='slot',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='littlelemon.timeslot'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+
+LOCATED_MODELS = ['archivedorder', 'cart', 'menuitem', 'order', 'timeslot']
+
+
+def add_default_location(apps, schema_editor):
+    """Creates the settings.DEFAULT_LOCATION location and gives it every existing row.
+
+    Location databases get it from the default database, see littlelemon.replication, unless they already hold
+    rows that need one.
+    """
+    db = schema_editor.connection.alias
+    models_to_fill = [apps.get_model('littlelemon', model_name) for model_name in LOCATED_MODELS]
+    if db != DEFAULT_DB_ALIAS and not any(model.objects.using(db).exists() for model in models_to_fill):
+        return
+    location_model = apps.get_model('littlelemon', 'Location')
+    location, _ = location_model.objects.using(db).get_or_create(
+        slug=getattr(settings, 'DEFAULT_LOCATION', 'main'), defaults={'name': 'Little Lemon'})
+    for model in models_to_fill:
+        model.objects.using(db).filter(location__isnull=True).update(location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0008_cart_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='timeslot',
+            name='start',
+            field=models.DateTimeField(),
+        ),
+    ] + [
+        migrations.AddField(
+            model_name=model_name,
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    to='littlelemon.location'),
+        )
+        for model_name in LOCATED_MODELS
+    ] + [
+        migrations.RunPython(add_default_location, migrations.RunPython.noop),
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.location'),
+        )
+        for model_name in LOCATED_MODELS
+    ] + [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['location', 'user'], name='littlelemon_locatio_95dc4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'location'], name='littlelemon_user_id_7bfaba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['location', 'category'], name='littlelemon_locatio_de1d5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['location', 'featured'], name='littlelemon_locatio_ca19e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['location', 'user'], name='littlelemon_locatio_094afc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['location', 'date'], name='littlelemon_locatio_e9707e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timeslot',
+            constraint=models.UniqueConstraint(fields=('location', 'start'), name='timeslot_unique_location_start'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:41
+
+from django.db import migrations, models
+
+
+def number_tickets(apps, schema_editor):
+    """Places the existing tickets in the feed in the order they last changed."""
+    db = schema_editor.connection.alias
+    ticket_model = apps.get_model('littlelemon', 'PreparationTicket')
+    tickets = list(ticket_model.objects.using(db).order_by('updated_at', 'id').only('id'))
+    for position, ticket in enumerate(tickets, 1):
+        ticket.position = position
+    ticket_model.objects.using(db).bulk_update(tickets, ['position'], batch_size=500)
+    apps.get_model('littlelemon', 'Sequence').objects.using(db).create(name='preparation-tickets', value=len(tickets))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0009_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='preparationticket',
+            name='position',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(number_tickets, migrations.RunPython.noop),
+    ]
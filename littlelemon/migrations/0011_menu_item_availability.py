@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0010_ticket_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='available',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedorderitem',
+            name='menuitem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.menuitem'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='menuitem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.menuitem'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0011_menu_item_availability'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='preparationticket',
+            name='menuitem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.menuitem'),
+        ),
+        migrations.CreateModel(
+            name='RemovedTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.BigIntegerField()),
+                ('position', models.BigIntegerField(db_index=True)),
+                ('removed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.location')),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_order_locations(apps, schema_editor):
+    db = schema_editor.connection.alias
+    order_model = apps.get_model('littlelemon', 'Order')
+    apps.get_model('littlelemon', 'PreparationTicket').objects.using(db).update(location=models.Subquery(
+        order_model.objects.using(db).filter(id=models.OuterRef('order_id')).values('location_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0012_removed_tickets'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='preparationticket',
+            name='littlelemon_done_7087b6_idx',
+        ),
+        migrations.AddField(
+            model_name='preparationticket',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='littlelemon.location'),
+        ),
+        migrations.RunPython(copy_order_locations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='preparationticket',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='littlelemon.location'),
+        ),
+        migrations.AlterField(
+            model_name='preparationticket',
+            name='position',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='removedticket',
+            name='position',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='preparationticket',
+            index=models.Index(fields=['location', 'done', 'menuitem', 'quantity'],
+                               name='littlelemon_locatio_b8c59f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='preparationticket',
+            index=models.Index(fields=['location', 'position'], name='littlelemon_locatio_c79978_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='preparationticket',
+            index=models.Index(fields=['position'], name='littlelemon_positio_22eca7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='removedticket',
+            index=models.Index(fields=['location', 'position'], name='littlelemon_locatio_b63387_idx'),
+        ),
+    ]
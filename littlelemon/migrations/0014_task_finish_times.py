@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def estimate_finish_times(apps, schema_editor):
+    # a finished task was last claimed shortly before it finished
+    apps.get_model('littlelemon', 'Task').objects.using(schema_editor.connection.alias).filter(
+        status__in=['done', 'failed']).update(finished_at=Coalesce('locked_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('littlelemon', '0013_ticket_locations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='finished_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(estimate_finish_times, migrations.RunPython.noop),
+    ]
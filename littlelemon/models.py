@@ -1,5 +1,20 @@
+import django
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .money import MoneyField
+
+# CheckConstraint takes its Q as check before Django 5.1, which renamed it condition; the lock pins Django 4.1
+CHECK_CONDITION = 'condition' if django.VERSION >= (5, 1) else 'check'
+
+
+class Location(models.Model):
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
 
 
 class Category(models.Model):
@@ -12,45 +27,190 @@ class Category(models.Model):
 
 class MenuItem(models.Model):
     title = models.CharField(max_length=255, db_index=True)
-    price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
+    price = MoneyField(db_index=True)
     featured = models.BooleanField(db_index=True, default=False)
+    # false once taken off the menu, past orders keep referring to the item, see littlelemon.catalogue.remove_item
+    available = models.BooleanField(default=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [models.Index(fields=['location', 'category']), models.Index(fields=['location', 'featured'])]
+
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
-    unit_price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
-    price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
+    unit_price = MoneyField(db_index=True)
+    price = MoneyField(db_index=True)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.user.first_name + ' ' + self.user.last_name + '\'s cart'
 
     class Meta:
         unique_together = ('menuitem', 'user')
+        # covers the newest line per cart aggregate of littlelemon.cleanup.purge_abandoned_carts
+        indexes = [models.Index(fields=['user', 'created_at']), models.Index(fields=['user', 'location'])]
+
+
+class TimeSlot(models.Model):
+    """A location's kitchen capacity for the orders due in the slot starting at start, created when first booked."""
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
+    start = models.DateTimeField()
+    capacity = models.SmallIntegerField()
+    booked = models.SmallIntegerField(default=0)
+
+    def __str__(self):
+        return '{} ({}/{})'.format(self.start, self.booked, self.capacity)
+
+    class Meta:
+        constraints = [models.CheckConstraint(**{CHECK_CONDITION: models.Q(booked__lte=models.F('capacity'))},
+                                              name='timeslot_booked_within_capacity'),
+                       models.UniqueConstraint(fields=['location', 'start'], name='timeslot_unique_location_start')]
 
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True)
     status = models.BooleanField(db_index=True, default=0)
-    total = models.DecimalField(max_digits=6, decimal_places=2)
+    total = MoneyField()
     date = models.DateTimeField(db_index=True)
+    slot = models.ForeignKey(TimeSlot, on_delete=models.SET_NULL, null=True)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
 
     def __str__(self):
         return 'Order #{:06d}'.format(self.id)
 
+    class Meta:
+        indexes = [models.Index(fields=['location', 'user']), models.Index(fields=['location', 'date'])]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
-    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.PROTECT)
+    quantity = models.SmallIntegerField()
+    unit_price = MoneyField()
+    price = MoneyField()
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+
+class PreparationTicket(models.Model):
+    # deleting an order leaves a RemovedTicket for each of its tickets, see littlelemon.kitchen.remove_tickets
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.PROTECT)
+    quantity = models.SmallIntegerField()
+    done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # the order's, so the kitchen's queries don't join the orders
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
+    # place in the kitchen's change feed, moved to the end on every change, None until the order commits,
+    # see littlelemon.kitchen
+    position = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            # covers the open quantity per menu item aggregate of a location
+            models.Index(fields=['location', 'done', 'menuitem', 'quantity']),
+            models.Index(fields=['location', 'position']),
+            models.Index(fields=['position']),
+        ]
+
+
+class RemovedTicket(models.Model):
+    """A deleted preparation ticket, kept in the kitchen's change feed so screens drop the ticket too."""
+    ticket_id = models.BigIntegerField()
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
+    position = models.BigIntegerField()
+    removed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return 'Ticket #{} (removed)'.format(self.ticket_id)
+
+    class Meta:
+        indexes = [models.Index(fields=['location', 'position'])]
+
+
+class Sequence(models.Model):
+    """A named counter, see littlelemon.kitchen.next_positions."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.value)
+
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_orders")
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="archived_deliveries", null=True)
+    status = models.BooleanField(default=True)
+    total = MoneyField()
+    date = models.DateTimeField(db_index=True)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return 'Order #{:06d} (archived)'.format(self.id)
+
+    class Meta:
+        indexes = [models.Index(fields=['location', 'user'])]
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.PROTECT)
     quantity = models.SmallIntegerField()
-    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
-    price = models.DecimalField(max_digits=6, decimal_places=2)
+    unit_price = MoneyField()
+    price = MoneyField()
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, default=PENDING)
+    attempts = models.SmallIntegerField(default=0)
+    max_attempts = models.SmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=32, null=True)
+    locked_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # when the task became DONE or FAILED
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.name, self.id, self.status)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.SmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
 
     class Meta:
-        unique_together = ('order', 'menuitem')
\ No newline at end of file
+        unique_together = ('user', 'key')
@@ -0,0 +1,47 @@
+from django.db import models
+
+CENTS_PER_UNIT = 100
+
+# menu prices are limited to [0.00, 75.00]
+MAX_MENU_PRICE = 75 * CENTS_PER_UNIT
+
+
+class MoneyField(models.BigIntegerField):
+    """Amount of money stored as an integer number of cents."""
+    description = 'Amount of money in cents'
+
+
+def to_cents(value) -> int:
+    """Parse '12.5', '12.50', '12.', 12.5 or 12 into 1250 without going through Decimal.
+
+    Strings and floats follow the same rule, at most two decimal places: '12.345' and 12.345 are both rejected
+    rather than rounded. A float is read from its shortest repr, so 0.1 + 0.2 is rejected like '0.30000000000000004'.
+    """
+    if type(value) is bool:
+        raise ValueError('invalid money value: \'{}\''.format(value))
+    if type(value) is int:
+        return value * CENTS_PER_UNIT
+
+    text = repr(value) if type(value) is float else str(value).strip()
+    sign = 1
+    if text[:1] in ('-', '+'):
+        if text[0] == '-':
+            sign = -1
+        text = text[1:]
+
+    whole, dot, fraction = text.partition('.')
+    if not whole and not fraction:
+        raise ValueError('invalid money value: \'{}\''.format(value))
+    if whole and (not whole.isdigit() or not whole.isascii()):
+        raise ValueError('invalid money value: \'{}\''.format(value))
+    if fraction and (not fraction.isdigit() or not fraction.isascii() or len(fraction) > 2):
+        raise ValueError('invalid money value: \'{}\''.format(value))
+
+    return sign * (int(whole or 0) * CENTS_PER_UNIT + int(fraction.ljust(2, '0') if fraction else 0))
+
+
+def from_cents(cents: int) -> str:
+    """Format 1250 as '12.50'."""
+    if cents < 0:
+        return '-' + from_cents(-cents)
+    return '{}.{:02d}'.format(cents // CENTS_PER_UNIT, cents % CENTS_PER_UNIT)
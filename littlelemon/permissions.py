@@ -1,17 +1,18 @@
 from rest_framework.permissions import BasePermission
 
+from .roles import user_roles
+
 
 class IsManager(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and (request.user.groups.filter(name='Manager').exists()
-                                      or request.user.is_superuser))
+        return bool(request.user and ('Manager' in user_roles(request.user) or request.user.is_superuser))
 
 
 class IsCustomer(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.groups.filter(name='Customer').exists())
+        return bool(request.user and 'Customer' in user_roles(request.user))
 
 
 class IsDeliveryCrew(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.groups.filter(name='Delivery Crew').exists())
\ No newline at end of file
+        return bool(request.user and 'Delivery Crew' in user_roles(request.user))
\ No newline at end of file
@@ -0,0 +1,47 @@
+from django.db import router, transaction
+from django.db.models import F, OuterRef, Subquery, Max, ExpressionWrapper
+from django.db.models.functions import Mod
+
+from .catalogue import bump_version
+from .helper_functions import invalidate_cart_summary
+from .models import MenuItem, Cart
+from .money import MoneyField, MAX_MENU_PRICE
+
+
+def reprice_carts(menuitems) -> int:
+    """Brings every cart line for the given menu items up to the current menu price with one UPDATE."""
+    carts = Cart.objects.filter(menuitem__in=menuitems)
+    user_ids = {}
+    for location_id, user_id in carts.values_list('location_id', 'user_id').distinct():
+        user_ids.setdefault(location_id, []).append(user_id)
+
+    menu_price = Subquery(MenuItem.objects.filter(id=OuterRef('menuitem_id')).values('price')[:1])
+    updated = carts.update(unit_price=menu_price, price=F('quantity') * menu_price)
+
+    def invalidate():
+        for location_id, users in user_ids.items():
+            invalidate_cart_summary(location_id, *users)
+
+    transaction.on_commit(invalidate, using=router.db_for_write(Cart))
+    return updated
+
+
+def reprice_menu(menuitems, basis_points: int) -> tuple:
+    """Changes menu prices by basis_points / 100 percent, rounded to the cent, and reprices affected carts.
+
+    Raises ValueError when a price would leave the [0, MAX_MENU_PRICE] range.
+    """
+    factor = 10000 + basis_points
+    db = router.db_for_write(MenuItem)
+    with transaction.atomic(using=db):
+        highest = menuitems.aggregate(highest=Max('price'))['highest'] or 0
+        if factor < 0 or (highest * factor + 5000) // 10000 > MAX_MENU_PRICE:
+            raise ValueError('repriced menu items would leave the range [0.0, 75.0]')
+
+        # scaled - scaled % 10000 divides exactly, `/` is integer division on some backends and decimal on others
+        scaled = F('price') * factor + 5000
+        new_price = ExpressionWrapper((scaled - Mod(scaled, 10000)) / 10000, output_field=MoneyField())
+        items = menuitems.update(price=new_price)
+        carts = reprice_carts(menuitems)
+        transaction.on_commit(bump_version, using=db)
+    return items, carts
@@ -0,0 +1,70 @@
+import datetime
+import io
+import os
+import pstats
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+HEADER = 'X-Profile'
+
+SUFFIX = '.prof'
+
+# 20261019T081502123456-GET-812ms-api_orders_12.prof
+FILENAME = re.compile(r'^(\d{8}T\d{12})-([A-Z]+)-(\d+)ms-([\w.]*)\.prof$')
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def save_profile(profiler, method: str, path: str, elapsed_ms: int) -> str:
+    """Writes the profiler's stats to PROFILING_DIR and drops the oldest profiles beyond PROFILING_MAX_FILES."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^\w.]+', '_', path.strip('/'))[:80]
+    name = '{:%Y%m%dT%H%M%S%f}-{}-{}ms-{}{}'.format(datetime.datetime.now(datetime.timezone.utc), method,
+                                                    elapsed_ms, slug, SUFFIX)
+    profiler.dump_stats(directory / name)
+    rotate(directory, getattr(settings, 'PROFILING_MAX_FILES', 100))
+    return name
+
+
+def rotate(directory: Path, keep: int):
+    for name in sorted(profile_names(directory))[:-keep or None]:
+        try:
+            os.remove(directory / name)
+        except FileNotFoundError:
+            # another worker rotated it first
+            pass
+
+
+def profile_names(directory: Path) -> list:
+    if not directory.is_dir():
+        return []
+    return [entry.name for entry in os.scandir(directory) if FILENAME.match(entry.name)]
+
+
+def list_profiles() -> list:
+    """Stored profiles, newest first."""
+    out = []
+    for name in sorted(profile_names(profile_dir()), reverse=True):
+        taken, method, elapsed_ms, slug = FILENAME.match(name).groups()
+        out.append({
+            'name': name,
+            'taken': datetime.datetime.strptime(taken, '%Y%m%dT%H%M%S%f').replace(tzinfo=datetime.timezone.utc),
+            'method': method,
+            'path': '/' + slug.replace('_', '/'),
+            'elapsed_ms': int(elapsed_ms),
+        })
+    return out
+
+
+def profile_report(name: str, sort='cumulative', limit=40) -> str:
+    """pstats text report of a stored profile. Raises FileNotFoundError for unknown names."""
+    if not FILENAME.match(name):
+        raise FileNotFoundError(name)
+    out = io.StringIO()
+    pstats.Stats(str(profile_dir() / name), stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,42 @@
+from django.db import router, transaction
+from django.db.models import OuterRef, Subquery
+
+from .helper_functions import invalidate_cart_summary
+from .models import MenuItem, Cart, Order, OrderItem, ArchivedOrderItem
+
+
+def past_order_lines(user, order_id: int, location) -> list:
+    """(menuitem_id, quantity, current price) for each line of the user's order at location, archived or not.
+
+    The price is None for menu items taken off the menu. Raises Order.DoesNotExist when the user has no such order.
+    """
+    menu_price = Subquery(MenuItem.objects.filter(id=OuterRef('menuitem_id'), available=True).values('price')[:1])
+    for model in (OrderItem, ArchivedOrderItem):
+        lines = list(model.objects.filter(order_id=order_id, order__user=user, order__location=location)
+                     .annotate(menu_price=menu_price).values_list('menuitem_id', 'quantity', 'menu_price'))
+        if lines:
+            return lines
+    raise Order.DoesNotExist('order {} not found'.format(order_id))
+
+
+def reorder(user, order_id: int, location) -> tuple:
+    """Copies a past order into the user's cart at current menu prices with a single upsert.
+
+    An ordered item already in the cart is overwritten rather than added to, so retrying a reorder doesn't
+    double the cart. Returns the number of cart lines written and the ids of menu items no longer on the menu.
+    """
+    lines = past_order_lines(user, order_id, location)
+    available = [(menuitem_id, quantity, price) for menuitem_id, quantity, price in lines if price is not None]
+    unavailable = [menuitem_id for menuitem_id, _, price in lines if price is None]
+
+    db = router.db_for_write(Cart)
+    with transaction.atomic(using=db):
+        Cart.objects.bulk_create([
+            Cart(user=user, menuitem_id=menuitem_id, quantity=quantity, unit_price=price, price=quantity * price,
+                 location=location)
+            for menuitem_id, quantity, price in available
+        ], update_conflicts=True, unique_fields=['menuitem', 'user'],
+            # a reorder counts as adding to the cart, see cleanup.purge_abandoned_carts
+            update_fields=['quantity', 'unit_price', 'price', 'created_at'])
+        transaction.on_commit(lambda: invalidate_cart_summary(location.id, user.id), using=db)
+    return len(available), unavailable
@@ -0,0 +1,93 @@
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models.deletion import ProtectedError
+
+from .routers import REPLICATED_MODELS, is_sharded, location_databases
+
+# columns a copy doesn't need, by model, and what they hold instead; the copies only serve foreign keys and joins
+MASKED = {
+    'auth.user': {'password': '!'},
+}
+
+
+def replicated_models() -> list:
+    return [apps.get_model(app_label, model_name) for app_label, model_name in REPLICATED_MODELS]
+
+
+def copy_of(obj):
+    model = type(obj)
+    masked = MASKED.get(model._meta.label_lower, {})
+    return model(**{field.attname: masked.get(field.attname, getattr(obj, field.attname))
+                    for field in model._meta.concrete_fields})
+
+
+def delete_copies(model, db: str, ids: list):
+    """Deletes copies from db the way the default database deleted the originals.
+
+    The location's rows that refer to them are deleted, nulled or protect them as their foreign key says. Other
+    tables that refer to them are not part of a location database, so the copies themselves go with a plain DELETE.
+    """
+    for relation in model._meta.related_objects:
+        if not is_sharded(relation.related_model):
+            continue
+        rows = relation.related_model._base_manager.using(db).filter(**{relation.field.name + '__in': ids})
+        if relation.on_delete is models.PROTECT:
+            protected = list(rows[:1])
+            if protected:
+                raise ProtectedError('{} copies in {} are still referred to by {}'.format(
+                    model._meta.label, db, relation.related_model._meta.label), protected)
+        elif relation.on_delete is models.SET_NULL:
+            rows.update(**{relation.field.name: None})
+        else:
+            rows.delete()
+    model._base_manager.using(db).filter(pk__in=ids)._raw_delete(db)
+
+
+def write_copies(model, db: str, objs: list, deleted: list):
+    update_fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    with transaction.atomic(using=db):
+        if deleted:
+            delete_copies(model, db, deleted)
+        model._base_manager.using(db).bulk_create([copy_of(obj) for obj in objs], update_conflicts=True,
+                                                  unique_fields=[model._meta.pk.name], update_fields=update_fields)
+
+
+def replicate(model, ids: list):
+    """Brings the copies of model's rows with ids in every location database in line with the default database."""
+    databases = location_databases()
+    if not databases:
+        return
+    objs = list(model._base_manager.using(DEFAULT_DB_ALIAS).filter(pk__in=ids))
+    deleted = list(set(ids) - {obj.pk for obj in objs})
+    for db in databases:
+        write_copies(model, db, objs, deleted)
+
+
+def replicate_all(batch_size=1000) -> int:
+    """Copies every replicated row to every location database and deletes copies of rows that are gone.
+
+    For new location databases and for writes that send no signals, such as bulk_create and QuerySet.update.
+    Returns the number of rows copied to each database.
+    """
+    if not location_databases():
+        return 0
+    copied = 0
+    for model in replicated_models():
+        originals = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        for db in location_databases():
+            deleted = set(model._base_manager.using(db).values_list('pk', flat=True)) \
+                - set(originals.values_list('pk', flat=True))
+            if deleted:
+                with transaction.atomic(using=db):
+                    delete_copies(model, db, list(deleted))
+        last = None
+        while True:
+            batch = originals if last is None else originals.filter(pk__gt=last)
+            objs = list(batch[:batch_size])
+            if not objs:
+                break
+            for db in location_databases():
+                write_copies(model, db, objs, [])
+            copied += len(objs)
+            last = objs[-1].pk
+    return copied
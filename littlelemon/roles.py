@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import caches
+
+
+def role_cache_key(user_id: int) -> str:
+    return 'roles:{}'.format(user_id)
+
+
+def user_roles(user) -> frozenset:
+    """Names of the user's groups, kept in the per-user cache all workers share until membership changes.
+
+    Changes made through the ORM invalidate the copy on commit, see littlelemon.signals.groups_changed and
+    littlelemon.groups; settings.ROLE_CACHE_TTL bounds how long changes made behind Django's back go unseen.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    users = caches['users']
+    roles = users.get(role_cache_key(user.id))
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        users.set(role_cache_key(user.id), roles, getattr(settings, 'ROLE_CACHE_TTL', 60))
+    return roles
+
+
+def invalidate_roles(*user_ids: int):
+    caches['users'].delete_many([role_cache_key(user_id) for user_id in user_ids])
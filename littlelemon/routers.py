@@ -0,0 +1,94 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# cleared only while a request that may read from a replica runs, see littlelemon.middleware.ReplicaPinningMiddleware;
+# task workers and management commands read what they are about to write, so they stay on the primary
+use_primary = ContextVar('use_primary', default=True)
+
+# credentials are read right after they are created, replication lag would log clients out
+PRIMARY_ONLY_APPS = ('sessions', 'authtoken')
+
+# the location the current request or task works for, see littlelemon.middleware.LocationMiddleware
+current_location = ContextVar('current_location', default=None)
+
+# tables holding a location's menu, carts and orders, placed in the location's database by LocationShardRouter;
+# a checkout writes the cart, order, slot, tickets, receipt task and idempotency key, so all of them live together
+SHARDED_MODELS = ('menuitem', 'cart', 'timeslot', 'order', 'orderitem', 'preparationticket', 'removedticket',
+                  'sequence', 'archivedorder', 'archivedorderitem', 'task', 'idempotencykey')
+
+# tables the sharded ones refer to, kept in the default database and copied to every location database,
+# see littlelemon.replication
+REPLICATED_MODELS = (('auth', 'user'), ('littlelemon', 'location'), ('littlelemon', 'category'))
+
+# the apps whose schema a location database gets, the sharded tables and the copies they refer to
+LOCATION_DATABASE_APPS = ('littlelemon', 'auth', 'contenttypes')
+
+
+def location_db(location=None) -> str:
+    """Database alias holding the location's orders, 'default' unless settings.LOCATION_DATABASES names one."""
+    if location is None:
+        return 'default'
+    return getattr(settings, 'LOCATION_DATABASES', {}).get(location.slug, 'default')
+
+
+def location_databases() -> list:
+    """Aliases of the location databases other than the default database."""
+    return sorted(set(getattr(settings, 'LOCATION_DATABASES', {}).values()) - {'default'})
+
+
+def is_sharded(model) -> bool:
+    return model._meta.app_label == 'littlelemon' and model._meta.model_name in SHARDED_MODELS
+
+
+class PrimaryReplicaRouter:
+    """Sends reads to one of settings.DATABASE_REPLICAS and everything else to the default (primary) database.
+
+    Reads go to the primary as well while use_primary is set, which it is outside the requests
+    littlelemon.middleware.ReplicaPinningMiddleware lets read from a replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or use_primary.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold copies of the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in getattr(settings, 'DATABASE_REPLICAS', []):
+            return False
+        return None
+
+
+class LocationShardRouter:
+    """Sends a location's tables to the current location's database, see SHARDED_MODELS and location_db.
+
+    Foreign keys only work within one database, so every location database also holds copies of the users,
+    locations and categories those tables refer to, see REPLICATED_MODELS. Other models are left to the next router.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            return None
+        return location_db(current_location.get())
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the tables a location's rows refer to are copied to every location database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in location_databases():
+            return None
+        return app_label in LOCATION_DATABASE_APPS
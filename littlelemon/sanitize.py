@@ -0,0 +1,23 @@
+# characters that make bleach do more than return its input unchanged
+MARKUP_CHARACTERS = ('<', '>', '&')
+
+
+def needs_cleaning(value: str) -> bool:
+    if not value.isprintable():
+        return True
+    for character in MARKUP_CHARACTERS:
+        if character in value:
+            return True
+    return False
+
+
+def clean_text(value) -> str:
+    """Same result as bleach.clean, without running the HTML parser on plain text, see tests.CleanTextTests."""
+    value = str(value)
+    if not needs_cleaning(value):
+        return value
+
+    # bleach pulls in html5lib, only pay for the import when markup actually shows up
+    import bleach
+    return bleach.clean(value)
+
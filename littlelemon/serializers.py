@@ -1,16 +1,43 @@
 from rest_framework import serializers
-from django.contrib.auth.models import User, Group
-from djoser.serializers import UserCreateSerializer
-from .models import MenuItem, Category, Cart, Order, OrderItem
-from decimal import Decimal
-import bleach
+from django.contrib.auth.models import User
+from .models import MenuItem, Category, Cart, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, PreparationTicket
+from .money import to_cents, from_cents, MAX_MENU_PRICE
+from .sanitize import clean_text
 
 
-class LLAPIUserCreateSerializer(UserCreateSerializer):
-    def create(self, validated_data):
-        user = super().create(validated_data)
-        Group.objects.get(name="Customer").user_set.add(user)
-        return user
+class AmountField(serializers.Field):
+    """Renders integer cents as a '12.50' string and parses input back to cents."""
+    default_error_messages = {
+        'invalid': 'A valid amount of money is required.',
+    }
+
+    def to_representation(self, value):
+        return from_cents(value)
+
+    def to_internal_value(self, data):
+        try:
+            return to_cents(data)
+        except (TypeError, ValueError):
+            self.fail('invalid')
+
+
+class SparseFieldsMixin:
+    """Serializes only the given fields and nests only the Meta.expandable relations listed in expand.
+
+    Without either argument the representation is unchanged, otherwise relations that aren't expanded are
+    rendered as their id.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in self.Meta.expandable:
+            if name in self.fields and name not in (expand or ()):
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -39,7 +66,7 @@ class CategorySerializer(serializers.ModelSerializer):
                 return c_ref[0].id
 
             raise serializers.ValidationError('Invalid category field: \'{}\''.format(self))
-        elif type(self) is dict:
+        elif isinstance(self, dict):
             if 'id' in self:
                 c_ref = Category.objects.filter(id=self['id'])
                 if c_ref:
@@ -64,17 +91,21 @@ class CategorySerializer(serializers.ModelSerializer):
         raise serializers.ValidationError('Invalid category data: \'{}\''.format(self))
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer()
+    price = AmountField()
 
     class Meta:
         model = MenuItem
         fields = ['id', 'title', 'price', 'featured', 'category']
+        expandable = ['category']
         depth = 1
 
     def create(self, validated_data):
         c_ref = Category.objects.get(id=validated_data['category'])
-        return MenuItem.objects.create(title=validated_data['title'], price=validated_data['price'], category=c_ref)
+        location = {'location': validated_data['location']} if 'location' in validated_data else {}
+        return MenuItem.objects.create(title=validated_data['title'], price=validated_data['price'], category=c_ref,
+                                       **location)
 
     def validate(self, data):
         out_data = {}
@@ -92,13 +123,9 @@ class MenuItemSerializer(serializers.ModelSerializer):
         if len(errors) > 0:
             raise serializers.ValidationError(errors)
 
-        price = Decimal(bleach.clean(data['price']))
-        if price > 75 or price < 0:
-            raise serializers.ValidationError('Invalid price: expected range [0.0, 75.0].')
-
-        out_data['price'] = price
+        out_data['price'] = MenuItemSerializer.check_price(data['price'])
 
-        title = bleach.clean(data['title'])
+        title = clean_text(data['title'])
         if len(title) > 100:
             raise serializers.ValidationError('Invalid title: exceeds character limit of 100.')
 
@@ -109,18 +136,38 @@ class MenuItemSerializer(serializers.ModelSerializer):
 
         return out_data
 
+    @staticmethod
+    def parse_price(value) -> int:
+        try:
+            return to_cents(value)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Invalid price: \'{}\' is not a valid amount.'.format(value))
+
+    @staticmethod
+    def check_price(cents: int) -> int:
+        if cents > MAX_MENU_PRICE or cents < 0:
+            raise serializers.ValidationError('Invalid price: expected range [0.0, 75.0].')
+        return cents
+
+    @staticmethod
+    def parse_input(data) -> dict:
+        """Copies request data with the price in cents, the way AmountField hands it to validate().
+
+        For the views that call validate() and validate_partial_data() themselves instead of is_valid().
+        """
+        data = {key: data[key] for key in data}
+        if 'price' in data:
+            data['price'] = MenuItemSerializer.parse_price(data['price'])
+        return data
+
     def validate_partial_data(self):
         out_data = {}
 
         if 'price' in self:
-            price = Decimal(bleach.clean(self['price']))
-            if price > 75 or price < 0:
-                raise serializers.ValidationError('Invalid price: expected range [0.0, 75.0].')
-
-            out_data['price'] = price
+            out_data['price'] = MenuItemSerializer.check_price(self['price'])
 
         if 'title' in self:
-            title = bleach.clean(self['title'])
+            title = clean_text(self['title'])
             if len(title) > 100:
                 raise serializers.ValidationError('Invalid title: exceeds character limit of 100.')
 
@@ -139,19 +186,47 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class CartSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source='menuitem.title', read_only=True)
+    unit_price = AmountField()
+    price = AmountField()
+
     class Meta:
         model = Cart
-        fields = ['menuitem', 'quantity', 'unit_price', 'price']
+        fields = ['menuitem', 'title', 'quantity', 'unit_price', 'price']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # depth = 1 would also serialize the crew member's groups and permissions, one query each per order
+    delivery_crew = UserSerializer(read_only=True)
+    total = AmountField()
+
     class Meta:
         model = Order
         depth = 1
         fields = ['id', 'delivery_crew', 'status', 'total', 'date']
+        expandable = ['delivery_crew']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    unit_price = AmountField()
+    price = AmountField()
+
     class Meta:
         model = OrderItem
         fields = ['id', 'menuitem', 'quantity', 'unit_price', 'price']
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class PreparationTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PreparationTicket
+        fields = ['id', 'order', 'menuitem', 'quantity', 'done', 'updated_at']
@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .catalogue import bump_version
+from .helper_functions import invalidate_cart_summary
+from .locations import invalidate_locations
+from .models import MenuItem, Category, Location, Cart
+from .replication import replicate
+from .roles import invalidate_roles
+from .routers import location_databases
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_item_changed(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: bump_version(instance.location_id), using=using)
+
+
+@receiver(pre_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, using, **kwargs):
+    # the item's cart lines go with it, without signals of their own
+    user_ids = list(Cart.objects.using(using).filter(menuitem=instance).values_list('user_id', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_cart_summary(instance.location_id, *user_ids), using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def menu_changed(sender, **kwargs):
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def locations_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_locations)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def copied_row_changed(sender, instance, using, **kwargs):
+    # location databases keep copies for their foreign keys, see littlelemon.replication
+    if not location_databases():
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: replicate(sender, [pk]), using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear() sends post_clear without the users it removed
+        instance._cleared_user_ids = list(sender.objects.filter(group=instance).values_list('user_id', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = instance.__dict__.pop('_cleared_user_ids', [])
+    else:
+        user_ids = list(pk_set)
+    transaction.on_commit(lambda: invalidate_roles(*user_ids))
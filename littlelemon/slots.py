@@ -0,0 +1,106 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TimeSlot
+
+
+class SlotFull(Exception):
+    pass
+
+
+def slot_minutes() -> int:
+    return getattr(settings, 'ORDER_SLOT_MINUTES', 15)
+
+
+def slot_capacity() -> int:
+    return getattr(settings, 'ORDER_SLOT_CAPACITY', 20)
+
+
+def slot_start(moment: datetime.datetime) -> datetime.datetime:
+    """Start of the slot moment falls in, in the current time zone."""
+    moment = timezone.localtime(moment)
+    minute = moment.minute - moment.minute % slot_minutes()
+    return moment.replace(minute=minute, second=0, microsecond=0)
+
+
+def is_open(moment: datetime.datetime) -> bool:
+    opens, closes = getattr(settings, 'ORDER_SLOT_HOURS', (0, 24))
+    return opens <= timezone.localtime(moment).hour < closes
+
+
+def check_schedule(moment: datetime.datetime):
+    """Raises ValueError unless moment is in the future, within ORDER_SCHEDULE_DAYS and inside opening hours."""
+    now = timezone.now()
+    if moment <= now:
+        raise ValueError('date: expected a time in the future')
+    if moment > now + datetime.timedelta(days=getattr(settings, 'ORDER_SCHEDULE_DAYS', 7)):
+        raise ValueError('date: orders can be scheduled at most {} days ahead'.format(
+            getattr(settings, 'ORDER_SCHEDULE_DAYS', 7)))
+    if not is_open(moment):
+        raise ValueError('date: expected a time between {}:00 and {}:00'.format(
+            *getattr(settings, 'ORDER_SLOT_HOURS', (0, 24))))
+
+
+def check_open(moment: datetime.datetime):
+    """Raises ValueError unless an order due right away at moment falls inside opening hours."""
+    if not is_open(moment):
+        raise ValueError('the kitchen takes orders between {}:00 and {}:00, schedule one with date'.format(
+            *getattr(settings, 'ORDER_SLOT_HOURS', (0, 24))))
+
+
+def book_slot(location, moment: datetime.datetime) -> TimeSlot:
+    """Takes one place in the location's slot moment falls in. Raises SlotFull when the slot is fully booked.
+
+    The place is taken with a conditional UPDATE, so concurrent bookings can't overfill a slot, and it is given back
+    if the surrounding transaction rolls back.
+    """
+    start = slot_start(moment)
+    db = router.db_for_write(TimeSlot)
+    with transaction.atomic(using=db):
+        slot, _ = TimeSlot.objects.get_or_create(location=location, start=start,
+                                                 defaults={'capacity': slot_capacity()})
+        if not TimeSlot.objects.filter(id=slot.id, booked__lt=F('capacity')).update(booked=F('booked') + 1):
+            raise SlotFull('time slot {} is fully booked'.format(start.strftime('%Y-%m-%d %H:%M')))
+        transaction.on_commit(lambda: invalidate_availability(location, start.date()), using=db)
+    return slot
+
+
+def release_slot(location, slot: TimeSlot):
+    """Gives back the place an order took in the location's slot, for orders deleted before they are due."""
+    db = router.db_for_write(TimeSlot)
+    with transaction.atomic(using=db):
+        TimeSlot.objects.filter(id=slot.id, booked__gt=0).update(booked=F('booked') - 1)
+        transaction.on_commit(lambda: invalidate_availability(location, timezone.localdate(slot.start)),
+                              using=db)
+
+
+def availability_key(location, day: datetime.date) -> str:
+    return 'slot-availability:{}:{}'.format(location.id, day.isoformat())
+
+
+def slot_availability(location, day: datetime.date) -> list:
+    """Free places per slot of location within opening hours on day, cached for ORDER_SLOT_AVAILABILITY_TTL s."""
+    slots = cache.get(availability_key(location, day))
+    if slots is None:
+        opens, closes = getattr(settings, 'ORDER_SLOT_HOURS', (0, 24))
+        first = timezone.make_aware(datetime.datetime.combine(day, datetime.time(opens)))
+        last = first + datetime.timedelta(hours=closes - opens)
+        free = dict(TimeSlot.objects.filter(location=location, start__gte=first, start__lt=last)
+                    .values_list('start', F('capacity') - F('booked')))
+
+        slots = []
+        start = first
+        while start < last:
+            slots.append({'start': start.isoformat(), 'available': free.get(start, slot_capacity())})
+            start += datetime.timedelta(minutes=slot_minutes())
+        cache.set(availability_key(location, day), slots, getattr(settings, 'ORDER_SLOT_AVAILABILITY_TTL', 30))
+    return slots
+
+
+def invalidate_availability(location, *days: datetime.date):
+    cache.delete_many([availability_key(location, day) for day in days])
@@ -0,0 +1,111 @@
+import datetime
+import logging
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .cleanup import delete_in_batches
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# task name -> callable taking the task payload as keyword arguments
+registry = {}
+
+
+def task(name=None, max_attempts=3):
+    """Registers a function as a task handler; call func.enqueue(**payload) to queue it."""
+    def decorator(func):
+        task_name = name or func.__name__
+        registry[task_name] = func
+        func.enqueue = lambda **payload: enqueue(task_name, max_attempts=max_attempts, **payload)
+        return func
+    return decorator
+
+
+def enqueue(name: str, max_attempts=3, **payload) -> Task:
+    """Queues a task. Called inside a transaction the task only becomes visible if that transaction commits."""
+    return Task.objects.create(name=name, payload=payload, max_attempts=max_attempts)
+
+
+def claim_batch(batch_size: int) -> list:
+    """Claims up to batch_size due tasks with a conditional UPDATE, so concurrent workers never share a task."""
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=getattr(settings, 'TASK_LOCK_TIMEOUT', 300))
+    due = Q(status=Task.PENDING, run_after__lte=now) | Q(status=Task.RUNNING, locked_at__lt=stale)
+
+    ids = list(Task.objects.filter(due).order_by('run_after', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    worker = uuid.uuid4().hex
+    Task.objects.filter(due, id__in=ids).update(status=Task.RUNNING, locked_by=worker, locked_at=now)
+    return list(Task.objects.filter(locked_by=worker, status=Task.RUNNING).order_by('id'))
+
+
+def renew_lock(t: Task) -> bool:
+    """Restarts the lock timeout of a claimed task, False when another worker has taken the task over since."""
+    t.locked_at = timezone.now()
+    return bool(Task.objects.filter(id=t.id, status=Task.RUNNING, locked_by=t.locked_by)
+                .update(locked_at=t.locked_at))
+
+
+def run_batch(batch_size=50) -> int:
+    """Runs one batch of due tasks and returns how many were claimed.
+
+    Each task's lock is renewed right before it runs, so tasks late in a slow batch aren't handed to another worker
+    while they wait for their turn.
+    """
+    tasks = claim_batch(batch_size)
+    done = []
+    for t in tasks:
+        if not renew_lock(t):
+            continue
+        try:
+            handler = registry[t.name]
+            handler(**t.payload)
+            done.append(t.id)
+        except Exception:
+            logger.exception('task %s failed', t)
+            retry(t, traceback.format_exc())
+
+    if done:
+        Task.objects.filter(id__in=done, locked_by=tasks[0].locked_by).update(status=Task.DONE, locked_by=None,
+                                                                               finished_at=timezone.now())
+    return len(tasks)
+
+
+def retry(t: Task, error: str) -> bool:
+    """Schedules the next attempt of a failed task, or marks it FAILED after its last one.
+
+    A conditional UPDATE on the lock and attempt count t was read with: the worker holding the task, or anyone for a
+    task no worker holds (locked_by IS NULL). False when another worker has taken the task over or retried it since,
+    the task is left to it.
+    """
+    now = timezone.now()
+    attempts = t.attempts + 1
+    changes = {'attempts': attempts, 'last_error': error, 'locked_by': None}
+    if attempts < t.max_attempts:
+        changes.update(status=Task.PENDING, run_after=now + datetime.timedelta(seconds=2 ** attempts))
+    else:
+        changes.update(status=Task.FAILED, finished_at=now)
+    # locked_by=None filters on IS NULL
+    if not Task.objects.filter(id=t.id, locked_by=t.locked_by, attempts=t.attempts).update(**changes):
+        return False
+    for name, value in changes.items():
+        setattr(t, name, value)
+    return True
+
+
+def purge_finished(days=None, batch_size=1000) -> int:
+    """Deletes tasks that finished successfully more than settings.TASK_RETENTION_DAYS days ago.
+
+    Failed tasks are kept, they stay around until someone has looked at last_error.
+    """
+    if days is None:
+        days = getattr(settings, 'TASK_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    return delete_in_batches(Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff), batch_size)
@@ -0,0 +1,19 @@
+from django.core.mail import send_mail
+
+from .locations import at_location, get_location
+from .models import Order, OrderItem
+from .money import from_cents
+from .taskqueue import task
+
+
+@task(max_attempts=5)
+def send_order_receipt(order_id, location=None):
+    with at_location(get_location(location)):
+        order = Order.objects.select_related('user').get(id=order_id)
+        items = list(OrderItem.objects.filter(order=order).select_related('menuitem'))
+    if not order.user.email:
+        return
+
+    lines = ['{} x {}  {}'.format(item.quantity, item.menuitem.title, from_cents(item.price)) for item in items]
+    lines.append('Total  {}'.format(from_cents(order.total)))
+    send_mail('Little Lemon receipt for {}'.format(order), '\n'.join(lines), None, [order.user.email])
@@ -1,3 +1,1817 @@
-from django.test import TestCase
+import asyncio
+import cProfile
+from contextlib import ExitStack
+import datetime
+from decimal import Decimal
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock, skipUnless
+import zlib
 
-# Create your tests here.
+import msgpack
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import settings as project_settings
+
+from .models import (Location, Category, MenuItem, Cart, Order, OrderItem, ArchivedOrder, ArchivedOrderItem,
+                     IdempotencyKey, PreparationTicket, RemovedTicket, Task, TimeSlot)
+from . import catalogue
+from .admin import TimeSlotForm
+from .archive import archive_orders
+from .cleanup import purge_expired_cache_entries
+from .compression import GzipCodec, negotiate
+from .helper_functions import cart_summary, cart_summary_key
+from .idempotency import request_hash
+from .kitchen import create_tickets, last_position
+from .locations import LOCATIONS_KEY, at_location, get_location
+from .middleware import CompressionMiddleware, ReplicaPinningMiddleware
+from .money import to_cents, from_cents
+from .profiling import list_profiles, save_profile
+from .renderers import ORJSONRenderer, MessagePackRenderer
+from .replication import replicate_all
+from .roles import role_cache_key, user_roles
+from .routers import LocationShardRouter, PrimaryReplicaRouter, use_primary
+from .sanitize import clean_text
+from . import taskqueue
+
+# the 'shared' and 'users' caches outlive the test run and are seen by running servers, every test gets private ones
+isolated_caches = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+    'users': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'users'},
+})
+
+
+def setUpModule():
+    isolated_caches.enable()
+
+
+def tearDownModule():
+    isolated_caches.disable()
+
+
+def header_meta(headers: dict) -> dict:
+    """Request headers as the META keys test clients take, their headers argument needs Django 4.2."""
+    return {'HTTP_' + name.upper().replace('-', '_'): value for name, value in headers.items()}
+
+
+# orders placed without a date have to fall inside opening hours, whenever the tests run
+@override_settings(ORDER_SLOT_HOURS=(0, 24))
+class QueryCountTests(TestCase):
+    """Every route and method that can succeed has to run the same, bounded number of queries on ten times the data.
+
+    A difference between the two runs almost always means a query per row (N+1) slipped into the endpoint.
+    """
+    BASE_SIZE = 3
+    MAX_QUERIES = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = Group.objects.create(name='Customer')
+        cls.delivery_crew = Group.objects.create(name='Delivery Crew')
+        cls.managers = Group.objects.create(name='Manager')
+
+        cls.customer = User.objects.create(username='customer')
+        cls.customers.user_set.add(cls.customer)
+        cls.driver = User.objects.create(username='driver')
+        cls.delivery_crew.user_set.add(cls.driver)
+        cls.manager = User.objects.create(username='manager')
+        cls.managers.user_set.add(cls.manager)
+
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.location = get_location(None)
+
+    def seed(self, size: int) -> dict:
+        """Scales every table an endpoint reads with size and returns ids the endpoint paths refer to."""
+        menuitems = MenuItem.objects.bulk_create([
+            MenuItem(title='Item {}'.format(i), price=500 + i, featured=i % 2 == 0, category=self.category,
+                     location=self.location)
+            for i in range(size)
+        ])
+
+        users = User.objects.bulk_create([User(username='user-{}-{}'.format(size, i)) for i in range(3 * size)])
+        self.customers.user_set.add(*users[:size])
+        self.delivery_crew.user_set.add(*users[size:2 * size])
+        self.managers.user_set.add(*users[2 * size:])
+
+        # bulk_create sends no signals, location databases need copies of the new users
+        replicate_all()
+
+        spare = MenuItem.objects.create(title='Spare item', price=500, category=self.category, location=self.location)
+
+        orders = Order.objects.bulk_create(
+            [Order(user=self.customer, delivery_crew=self.driver, total=1500, date=timezone.now(),
+                   location=self.location)
+             for _ in range(size)]
+            + [Order(user=user, total=1500, date=timezone.now(), location=self.location) for user in users[:size]]
+            + [Order(user=self.customer, total=1500, date=timezone.now(), location=self.location)])
+        orderitems = OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+            for order in orders for menuitem in menuitems[:3]
+        ])
+        tickets = PreparationTicket.objects.bulk_create([
+            PreparationTicket(order=order, menuitem=menuitem, quantity=1, location=self.location)
+            for order in orders for menuitem in menuitems[:3]
+        ])
+
+        archived = ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=10 ** 6 + i, user=self.customer, delivery_crew=self.driver, total=1500,
+                          date=timezone.now(), location=self.location)
+            for i in range(size)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price,
+                              price=menuitem.price)
+            for order in archived for menuitem in menuitems[:3]
+        ])
+
+        Cart.objects.bulk_create([
+            Cart(user=self.customer, menuitem=menuitem, quantity=2, unit_price=menuitem.price,
+                 price=2 * menuitem.price, location=self.location)
+            for menuitem in menuitems
+        ])
+
+        return {
+            'order': orders[0].id,
+            # the customer's order no driver has picked up yet
+            'open_order': orders[-1].id,
+            'orderitem': orderitems[-1].id,
+            'menuitem': menuitems[0].id,
+            'spare': spare.id,
+            'menuitems': [menuitem.id for menuitem in menuitems],
+            'ticket': tickets[0].id,
+            'users': [user.id for user in users],
+            'driver': users[size].id,
+            'manager': users[2 * size].id,
+        }
+
+    def count_queries(self, user, method, path, data, size, status=None) -> int:
+        databases = sorted(connections if self.databases == '__all__' else self.databases)
+        with ExitStack() as stack:
+            for db in databases:
+                stack.enter_context(transaction.atomic(using=db))
+            with at_location(self.location):
+                context = self.seed(size)
+            client = APIClient(HTTP_X_LOCATION=self.location.slug)
+            client.force_authenticate(user)
+            # throttle history and cached summaries/snapshots live in the caches, measure the cold path
+            cache.clear()
+            caches['shared'].clear()
+            caches['users'].clear()
+
+            with ExitStack() as capture:
+                queries = [capture.enter_context(CaptureQueriesContext(connections[db])) for db in databases]
+                response = getattr(client, method)(path.format(**context),
+                                                   data(context) if callable(data) else data, format='json')
+            for db in databases:
+                transaction.set_rollback(True, using=db)
+
+        self.assertLess(response.status_code, 400, '{} {} failed: {}'.format(method.upper(), path, response.data))
+        if status is not None:
+            self.assertEqual(response.status_code, status, '{} {}: {}'.format(method.upper(), path, response.data))
+        return sum(len(captured) for captured in queries)
+
+    def assertQueryCountIndependentOfSize(self, user, endpoints):
+        """endpoints are (method, path, data) tuples, optionally followed by the status the response must have."""
+        for method, path, data, *status in endpoints:
+            with self.subTest(user=user.username, method=method, path=path):
+                base = self.count_queries(user, method, path, data, self.BASE_SIZE, *status)
+                large = self.count_queries(user, method, path, data, self.BASE_SIZE * 10, *status)
+                self.assertEqual(base, large, '{} {} ran {} queries on the base dataset and {} on the 10x dataset'
+                                 .format(method.upper(), path, base, large))
+                self.assertLessEqual(large, self.MAX_QUERIES)
+
+    def test_customer_endpoints(self):
+        self.assertQueryCountIndependentOfSize(self.customer, [
+            ('get', '/api/menu-items', None),
+            ('get', '/api/menu-items/', None),
+            ('get', '/api/menu-items/{menuitem}', None),
+            ('get', '/api/menu-items?fields=id,category', None),
+            ('get', '/api/menu-items?fields=title,category&expand=category', None),
+            ('get', '/api/menu-items/{menuitem}?fields=id,price', None),
+            ('get', '/api/menu-items/featured', None),
+            ('get', '/api/categories', None),
+            ('get', '/api/cart/menu-items', None),
+            ('post', '/api/cart/menu-items', lambda context: {'menuitem': context['spare'], 'quantity': 1}),
+            ('get', '/api/cart/summary', None),
+            ('get', '/api/cart/orders', None),
+            ('get', '/api/orders', None),
+            ('get', '/api/orders?history=true', None),
+            ('get', '/api/orders/{order}', None),
+            ('get', '/api/orders?fields=id,status', None),
+            ('get', '/api/orders?fields=id,delivery_crew,orderitems&expand=delivery_crew&history=true', None),
+            ('get', '/api/orders/{order}?fields=id,orderitems', None),
+            ('put', '/api/orders/{open_order}',
+             lambda context: {'id': context['orderitem'], 'quantity': 2, 'menuitem': context['spare']}),
+            ('patch', '/api/orders/{open_order}', lambda context: {'id': context['orderitem'], 'quantity': 2}),
+            ('post', '/api/orders', None),
+            ('get', '/api/orders/slots', None),
+            ('post', '/api/orders/{order}/reorder', None),
+            ('delete', '/api/cart/menu-items', None),
+        ])
+
+    def test_delivery_crew_endpoints(self):
+        self.assertQueryCountIndependentOfSize(self.driver, [
+            ('get', '/api/menu-items', None),
+            ('get', '/api/orders', None),
+            ('get', '/api/orders?history=true', None),
+            ('patch', '/api/orders/{order}', {'status': 1}),
+        ])
+
+    def test_manager_endpoints(self):
+        self.assertQueryCountIndependentOfSize(self.manager, [
+            ('get', '/api/menu-items', None),
+            ('post', '/api/menu-items', {'title': 'New item', 'price': '5.00', 'category': 'mains'}, 201),
+            ('post', '/api/menu-items/', {'title': 'Viewset item', 'price': '5.00',
+                                          'category': {'slug': 'mains', 'title': 'Mains'}}, 201),
+            ('put', '/api/menu-items/{menuitem}', {'title': 'Renamed', 'price': '9.99', 'category': 'mains'}),
+            ('patch', '/api/menu-items/{menuitem}', {'price': '9.99'}),
+            ('delete', '/api/menu-items/{menuitem}', None),
+            ('post', '/api/categories', {'slug': 'sides', 'title': 'Sides'}),
+            ('post', '/api/menu-items/reprice', {'percent': 5}),
+            ('post', '/api/menu-items/featured/toggle', lambda context: {'ids': context['menuitems']}),
+            ('get', '/api/groups/manager/users', None),
+            ('post', '/api/groups/manager/users', {'username': 'customer'}),
+            ('get', '/api/groups/manager/users?search=user&page=1', None),
+            ('post', '/api/groups/manager/users', lambda context: {'ids': context['users']}),
+            ('delete', '/api/groups/manager/users', lambda context: {'ids': context['users']}),
+            ('delete', '/api/groups/manager/users/{manager}', None),
+            ('get', '/api/groups/delivery-crew/users', None),
+            ('post', '/api/groups/delivery-crew/users', {'username': 'customer'}),
+            ('delete', '/api/groups/delivery-crew/users/{driver}', None),
+            ('get', '/api/orders', None),
+            ('get', '/api/orders?history=true', None),
+            ('get', '/api/orders?fields=id,delivery_crew&expand=delivery_crew', None),
+            ('put', '/api/orders/{order}', {'status': 1, 'delivery_crew': str(self.driver.id)}),
+            ('patch', '/api/orders/{order}', {'status': 1, 'username': 'driver'}),
+            ('delete', '/api/orders/{order}', None),
+            ('get', '/api/kitchen/queue', None),
+            ('get', '/api/kitchen/tickets', None),
+            ('patch', '/api/kitchen/tickets/{ticket}', {'done': True}),
+            ('get', '/api/profiles', None),
+        ])
+
+    def test_profile_endpoints(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILING_DIR=directory):
+            profiler = cProfile.Profile()
+            profiler.runcall(sum, [1, 2])
+            name = save_profile(profiler, 'GET', '/api/orders', 600)
+            self.assertQueryCountIndependentOfSize(self.manager, [
+                ('get', '/api/profiles', None),
+                ('get', '/api/profiles/' + name, None),
+            ])
+
+
+@skipUnless('uptown' in settings.DATABASES, 'needs the uptown database, see LocationDatabaseSettingsTests')
+class UptownQueryCountTests(QueryCountTests):
+    """The same endpoints at a location with a database of its own."""
+    # naming 'uptown' would fail the whole run under settings without it, skipped or not
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.location = Location.objects.create(slug='uptown', name='Uptown')
+        replicate_all()
+
+
+class MoneyTests(SimpleTestCase):
+    def test_to_cents(self):
+        for value, cents in [('12.5', 1250), ('12.50', 1250), ('12.', 1200), ('.5', 50), (' 7.1 ', 710),
+                             ('-1.05', -105), ('+3', 300), (12, 1200), (12.5, 1250), (12.0, 1200), (0.07, 7)]:
+            with self.subTest(value=value):
+                self.assertEqual(to_cents(value), cents)
+
+    def test_to_cents_rejects_more_than_two_decimals_for_strings_and_floats_alike(self):
+        for value in ['12.345', 12.345, 0.1 + 0.2, '', '.', '-', 'abc', '1e3', '1.2.3', '\u0661\u0662', float('inf'),
+                      float('nan'), True, None]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    to_cents(value)
+
+    def test_from_cents(self):
+        for cents, text in [(1250, '12.50'), (5, '0.05'), (0, '0.00'), (-105, '-1.05')]:
+            with self.subTest(cents=cents):
+                self.assertEqual(from_cents(cents), text)
+                self.assertEqual(to_cents(text), cents)
+
+
+class MoneyMigrationTests(TransactionTestCase):
+    """0002_money_in_cents converts the decimal amounts to cents and back."""
+    before = [('littlelemon', '0001_initial')]
+    after = [('littlelemon', '0002_money_in_cents')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forwards_and_backwards(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='customer')
+        category = apps.get_model('littlelemon', 'Category').objects.create(slug='mains', title='Mains')
+        menuitem = apps.get_model('littlelemon', 'MenuItem').objects.create(title='Soup', price=Decimal('12.50'),
+                                                                            category=category)
+        apps.get_model('littlelemon', 'Cart').objects.create(user=user, menuitem=menuitem, quantity=3,
+                                                            unit_price=Decimal('12.50'), price=Decimal('37.50'))
+        order = apps.get_model('littlelemon', 'Order').objects.create(user=user, total=Decimal('0.05'),
+                                                                     date='2026-01-01T12:00:00Z')
+        apps.get_model('littlelemon', 'OrderItem').objects.create(order=order, menuitem=menuitem, quantity=1,
+                                                                 unit_price=Decimal('0.05'), price=Decimal('0.05'))
+
+        apps = self.migrate(self.after)
+        self.assertEqual(apps.get_model('littlelemon', 'MenuItem').objects.get().price, 1250)
+        self.assertEqual(apps.get_model('littlelemon', 'Cart').objects.values_list('unit_price', 'price').get(),
+                         (1250, 3750))
+        self.assertEqual(apps.get_model('littlelemon', 'Order').objects.get().total, 5)
+        self.assertEqual(apps.get_model('littlelemon', 'OrderItem').objects.values_list('unit_price', 'price').get(),
+                         (5, 5))
+
+        apps = self.migrate(self.before)
+        self.assertEqual(apps.get_model('littlelemon', 'MenuItem').objects.get().price, Decimal('12.50'))
+        self.assertEqual(apps.get_model('littlelemon', 'Cart').objects.get().price, Decimal('37.50'))
+        self.assertEqual(apps.get_model('littlelemon', 'Order').objects.get().total, Decimal('0.05'))
+
+
+class CleanTextTests(SimpleTestCase):
+    """clean_text skips bleach for plain text, which is only safe while bleach would return that text unchanged."""
+    HOSTILE = [
+        '<script>alert(1)</script>', '<img src=x onerror=alert(1)>', '<a href="javascript:alert(1)">x</a>',
+        '<<script>script>', '</title><svg/onload=alert(1)>', '<!-- comment -->', '<![CDATA[x]]>', '&lt;b&gt;',
+        'fish & chips', '&amp;', '&#60;script&#62;', '1 < 2 > 0', '"quoted" \'single\'', '`backticks`',
+        'tab\tnew\nline\r\n', 'nul\x00byte', '\x1b[31mred', 'zero\u200bwidth', 'rtl\u202eoverride', '\ufeffbom',
+        '\ud800 lone surrogate', 'caf\u00e9 \u00bd \u2603 \U0001f355', '\uff1cscript\uff1e', 'Soup of the day', '',
+    ]
+
+    def assertSameAsBleach(self, value):
+        import bleach
+
+        self.assertEqual(clean_text(value), bleach.clean(value), repr(value))
+
+    def test_hostile_input(self):
+        for value in self.HOSTILE:
+            with self.subTest(value=value):
+                self.assertSameAsBleach(value)
+
+    def test_every_printable_character_is_left_alone_by_bleach(self):
+        printable = [chr(code) for code in range(sys.maxunicode + 1)
+                     if chr(code).isprintable() and chr(code) not in '<>&']
+        for start in range(0, len(printable), 2000):
+            self.assertSameAsBleach(''.join(printable[start:start + 2000]))
+
+
+class ApiProfileTests(SimpleTestCase):
+    def test_api_profile_does_not_import_auth_only_packages(self):
+        # a fresh interpreter, this one has imported everything the default profile uses
+        worker = ('import sys, django; django.setup(); from django.urls import get_resolver; '
+                  'get_resolver().url_patterns; from api.wsgi import application; '
+                  'print(" ".join(sorted(name for name in sys.modules if name.split(".")[0] in sys.argv[1:])))')
+        result = subprocess.run([sys.executable, '-c', worker, 'djoser', 'django_filters', 'bleach', 'html5lib'],
+                                cwd=settings.BASE_DIR, env=dict(os.environ, DJANGO_SETTINGS_MODULE='api.settings_api'),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions of PrimaryReplicaRouter and ReplicaPinningMiddleware.
+
+    Under test the replica mirrors the default database, so these check where reads are sent rather than what
+    they return.
+    """
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaPinningMiddleware(lambda request: self.router.db_for_read(MenuItem))
+        caches['shared'].clear()
+        caches['users'].clear()
+
+    def read_db(self, method='get', **headers) -> str:
+        return self.middleware(getattr(self.factory, method)('/api/menu-items', **header_meta(headers)))
+
+    def test_reads_outside_requests_stay_on_the_primary(self):
+        # task workers and management commands
+        self.assertEqual(self.router.db_for_read(MenuItem), 'default')
+
+    def test_reads_inside_safe_requests_go_to_a_replica(self):
+        token = use_primary.set(False)
+        try:
+            self.assertEqual(self.router.db_for_read(MenuItem), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+            self.assertEqual(self.router.db_for_write(MenuItem), 'default')
+        finally:
+            use_primary.reset(token)
+
+    def test_credentials_are_always_read_from_the_primary(self):
+        from rest_framework.authtoken.models import Token
+
+        token = use_primary.set(False)
+        try:
+            self.assertEqual(self.router.db_for_read(Token), 'default')
+        finally:
+            use_primary.reset(token)
+
+    def test_replicas_are_never_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica', 'littlelemon', 'menuitem'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'littlelemon', 'menuitem'))
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        self.assertEqual(self.read_db(authorization='Token one'), 'replica')
+        self.assertEqual(self.read_db('post', authorization='Token one'), 'default')
+        self.assertEqual(self.read_db(authorization='Token one'), 'default')
+        # other clients and anonymous requests are not pinned
+        self.assertEqual(self.read_db(authorization='Token two'), 'replica')
+        self.assertEqual(self.read_db(), 'replica')
+
+    def test_pins_expire(self):
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.read_db('post', authorization='Token one')
+        self.assertEqual(self.read_db(authorization='Token one'), 'replica')
+
+    def test_routing_is_restored_after_the_request(self):
+        self.read_db()
+        self.assertEqual(self.router.db_for_read(MenuItem), 'default')
+
+
+class CacheSettingsTests(SimpleTestCase):
+    """The project's file caches, each in a directory of its own."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        configured = {alias: dict(config, LOCATION=os.path.join(directory.name, alias))
+                      for alias, config in project_settings.CACHES.items() if alias != 'default'}
+        overridden = override_settings(CACHES=dict(settings.CACHES, **configured))
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def test_coordination_keys_outlive_many_users(self):
+        catalogue.bump_version()
+        version = caches['shared'].get(catalogue.VERSION_KEY)
+        for user_id in range(1000):
+            caches['users'].set(role_cache_key(user_id), frozenset(['Customer']), 60)
+            caches['shared'].set('replica-pin:{}'.format(user_id), True, 60)
+
+        self.assertEqual(caches['shared'].get(catalogue.VERSION_KEY), version)
+        self.assertEqual(len(caches['shared']._list_cache_files()), 1001)
+        self.assertLessEqual(len(caches['users']._list_cache_files()), 10000)
+
+    def test_cleanup_deletes_expired_pins(self):
+        catalogue.bump_version()
+        caches['shared'].set('replica-pin:gone', True, 60)
+        caches['shared'].set('replica-pin:active', True, 60)
+        with mock.patch('time.time', return_value=time.time() + 120):
+            caches['shared'].set('replica-pin:active', True, 60)
+            self.assertEqual(purge_expired_cache_entries(), 1)
+        self.assertIsNotNone(caches['shared'].get(catalogue.VERSION_KEY))
+        self.assertEqual(len(caches['shared']._list_cache_files()), 2)
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.menuitem = MenuItem.objects.create(title='Soup', price=500, category=category, location=location)
+
+    def order(self, days_ago, delivered=True, tickets_done=True) -> Order:
+        order = Order.objects.create(user=self.customer, status=delivered, total=500,
+                                     date=timezone.now() - datetime.timedelta(days=days_ago),
+                                     location=self.menuitem.location)
+        OrderItem.objects.create(order=order, menuitem=self.menuitem, quantity=1, unit_price=500, price=500)
+        PreparationTicket.objects.create(order=order, menuitem=self.menuitem, quantity=1, done=tickets_done,
+                                         location=order.location)
+        return order
+
+    def test_moves_old_delivered_orders(self):
+        old = [self.order(100), self.order(120)]
+        recent = self.order(10)
+        undelivered = self.order(100, delivered=False)
+
+        self.assertEqual(archive_orders(days=90, batch_size=1), 2)
+
+        self.assertCountEqual(ArchivedOrder.objects.values_list('id', flat=True), [order.id for order in old])
+        self.assertEqual(ArchivedOrderItem.objects.filter(order_id__in=[order.id for order in old]).count(), 2)
+        self.assertCountEqual(Order.objects.values_list('id', flat=True), [recent.id, undelivered.id])
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[order.id for order in old]).exists())
+        self.assertFalse(PreparationTicket.objects.filter(order_id__in=[order.id for order in old]).exists())
+
+    def test_keeps_orders_with_open_tickets(self):
+        cooking = self.order(100, tickets_done=False)
+
+        self.assertEqual(archive_orders(days=90), 0)
+        self.assertTrue(PreparationTicket.objects.filter(order=cooking, done=False).exists())
+
+        PreparationTicket.objects.filter(order=cooking).update(done=True)
+        self.assertEqual(archive_orders(days=90), 1)
+        self.assertFalse(PreparationTicket.objects.filter(order=cooking).exists())
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        taskqueue.registry['record'] = lambda **payload: self.calls.append(payload)
+        taskqueue.registry['fail'] = lambda **payload: 1 / 0
+
+    def tearDown(self):
+        del taskqueue.registry['record'], taskqueue.registry['fail']
+
+    def test_claims_are_exclusive(self):
+        tasks = [taskqueue.enqueue('record', n=n) for n in range(3)]
+        later = taskqueue.enqueue('record', n=3)
+        Task.objects.filter(id=later.id).update(run_after=timezone.now() + datetime.timedelta(hours=1))
+
+        first = taskqueue.claim_batch(2)
+        second = taskqueue.claim_batch(2)
+        self.assertEqual([t.id for t in first], [t.id for t in tasks[:2]])
+        self.assertEqual([t.id for t in second], [tasks[2].id])
+        self.assertEqual(taskqueue.claim_batch(2), [])
+
+    def test_stale_locks_are_reclaimed(self):
+        queued = taskqueue.enqueue('record')
+        taskqueue.claim_batch(1)
+        Task.objects.filter(id=queued.id).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+
+        self.assertEqual([t.id for t in taskqueue.claim_batch(1)], [queued.id])
+
+    def test_runs_tasks(self):
+        taskqueue.enqueue('record', n=1)
+
+        self.assertEqual(taskqueue.run_batch(), 1)
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_failed_tasks_are_retried_with_backoff(self):
+        queued = taskqueue.enqueue('fail', max_attempts=2)
+
+        with self.assertLogs('littlelemon.taskqueue', 'ERROR'):
+            taskqueue.run_batch()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.PENDING, 1))
+        self.assertIn('ZeroDivisionError', queued.last_error)
+        self.assertGreater(queued.run_after, timezone.now() + datetime.timedelta(seconds=1))
+        # backing off
+        self.assertEqual(taskqueue.run_batch(), 0)
+
+        Task.objects.filter(id=queued.id).update(run_after=timezone.now())
+        with self.assertLogs('littlelemon.taskqueue', 'ERROR'):
+            taskqueue.run_batch()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.FAILED, 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_tasks_taken_over_while_waiting_in_a_batch_are_skipped(self):
+        first, second = taskqueue.enqueue('record', n=1), taskqueue.enqueue('record', n=2)
+
+        def slow(**payload):
+            # the batch ran past the lock timeout and another worker reclaimed the task still waiting
+            Task.objects.filter(id=second.id).update(locked_by='other')
+            self.calls.append(payload)
+        taskqueue.registry['record'] = slow
+
+        self.assertEqual(taskqueue.run_batch(), 2)
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertEqual(Task.objects.get(id=first.id).status, Task.DONE)
+        self.assertEqual(Task.objects.get(id=second.id).locked_by, 'other')
+
+    def test_retries_leave_tasks_of_other_workers_alone(self):
+        queued = taskqueue.enqueue('record')
+        [claimed] = taskqueue.claim_batch(1)
+        # the lock timed out and another worker reclaimed the task
+        Task.objects.filter(id=queued.id).update(locked_by='other')
+
+        self.assertFalse(taskqueue.retry(claimed, 'late failure'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.locked_by), (Task.RUNNING, 0, 'other'))
+
+        Task.objects.filter(id=queued.id).update(status=Task.FAILED, locked_by=None)
+        queued.refresh_from_db()
+        self.assertTrue(taskqueue.retry(queued, 'retried by hand'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.last_error), (Task.PENDING, 1, 'retried by hand'))
+
+    def test_purges_finished_tasks(self):
+        old_done, old_failed, recent_done, long_running = [taskqueue.enqueue('record') for _ in range(4)]
+        Task.objects.filter(id__in=[old_done.id, old_failed.id, long_running.id]).update(
+            created_at=timezone.now() - datetime.timedelta(days=30))
+        Task.objects.filter(id=old_failed.id).update(status=Task.FAILED,
+                                                     finished_at=timezone.now() - datetime.timedelta(days=30))
+        Task.objects.filter(id=old_done.id).update(status=Task.DONE,
+                                                   finished_at=timezone.now() - datetime.timedelta(days=30))
+        # queued a month ago, finished just now
+        taskqueue.run_batch()
+        self.assertEqual(Task.objects.filter(finished_at__isnull=True).count(), 0)
+
+        self.assertEqual(taskqueue.purge_finished(days=7), 1)
+        self.assertCountEqual(Task.objects.values_list('id', flat=True),
+                              [old_failed.id, recent_done.id, long_running.id])
+
+
+class KitchenFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.menuitems = [MenuItem.objects.create(title='Item {}'.format(i), price=500, category=category,
+                                                 location=location)
+                         for i in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def place_order(self, commit=True) -> list:
+        order = Order.objects.create(user=self.manager, total=1000, date=timezone.now(),
+                                     location=self.menuitems[0].location)
+        with self.captureOnCommitCallbacks(execute=commit):
+            return create_tickets(order, [Cart(menuitem=menuitem, quantity=1) for menuitem in self.menuitems])
+
+    def feed(self, since=None) -> dict:
+        response = self.client.get('/api/kitchen/tickets', {} if since is None else {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_follows_new_and_changed_tickets(self):
+        first = self.place_order()
+        listing = self.feed()
+        self.assertEqual([t['id'] for t in listing['tickets']], [t.id for t in first])
+
+        self.assertEqual(self.feed(listing['cursor'])['tickets'], [])
+        second = self.place_order()
+        self.client.patch('/api/kitchen/tickets/{}'.format(first[0].id), {'done': True}, format='json')
+
+        delta = self.feed(listing['cursor'])
+        self.assertEqual([t['id'] for t in delta['tickets']], [second[0].id, second[1].id, first[0].id])
+        self.assertTrue(delta['tickets'][-1]['done'])
+        self.assertEqual(self.feed(delta['cursor']), {'cursor': delta['cursor'], 'tickets': [], 'removed': []})
+
+    def test_checkouts_place_their_tickets_once_committed(self):
+        listing = self.feed()
+        # the feed counter isn't written before the checkout commits, so checkouts don't wait for each other
+        with CaptureQueriesContext(connection) as queries:
+            lost = self.place_order(commit=False)
+        self.assertFalse(any('littlelemon_sequence' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.feed(listing['cursor'])['tickets'], [])
+        self.assertEqual([t['id'] for t in self.feed()['tickets']], [ticket.id for ticket in lost])
+
+        # tickets a stopped process left without a position are placed by the next checkout
+        placed = self.place_order()
+        delta = self.feed(listing['cursor'])
+        self.assertEqual([t['id'] for t in delta['tickets']], [ticket.id for ticket in lost + placed])
+        self.assertEqual(delta['cursor'], last_position())
+
+    def test_cursor_reports_tickets_of_deleted_orders(self):
+        tickets = self.place_order()
+        kept = self.place_order()
+        listing = self.feed()
+
+        self.client.delete('/api/orders/{}'.format(tickets[0].order_id))
+        delta = self.feed(listing['cursor'])
+        self.assertEqual(delta['tickets'], [])
+        self.assertEqual(delta['removed'], [ticket.id for ticket in tickets])
+        self.assertEqual([t['id'] for t in self.feed()['tickets']], [ticket.id for ticket in kept])
+        self.assertEqual(self.feed(delta['cursor'])['removed'], [])
+
+        out = io.StringIO()
+        call_command('cleanup_stale_data', stdout=out)
+        self.assertIn('removed tickets:        0 rows', out.getvalue())
+        RemovedTicket.objects.update(removed_at=timezone.now() - datetime.timedelta(days=3))
+        call_command('cleanup_stale_data', stdout=out)
+        self.assertFalse(RemovedTicket.objects.exists())
+
+    def test_cursor_does_not_depend_on_timestamps(self):
+        # a change committing late still carries the time it was written
+        listing = self.feed()
+        ticket = self.place_order()[0]
+        PreparationTicket.objects.filter(id=ticket.id).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+
+        self.assertIn(ticket.id, [t['id'] for t in self.feed(listing['cursor'])['tickets']])
+
+    def test_rejects_malformed_cursors(self):
+        response = self.client.get('/api/kitchen/tickets', {'since': '2026-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup, cls.salad = [MenuItem.objects.create(title=title, price=500, category=category, location=location)
+                               for title in ('Soup', 'Salad')]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def summary(self) -> dict:
+        return self.client.get('/api/cart/summary').data
+
+    def test_cart_writes_refresh_the_summary_once_committed(self):
+        self.assertEqual(self.summary(), {'lines': 0, 'items': 0, 'subtotal': '0.00'})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post('/api/cart/menu-items', {'menuitem': self.soup.id, 'quantity': 2}, format='json')
+        # kept where every worker reads it, the invalidation on commit reaches all of them
+        key = cart_summary_key(self.soup.location_id, self.customer.id)
+        self.assertIsNotNone(caches['users'].get(key))
+        self.assertIsNone(cache.get(key))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.summary(), {'lines': 1, 'items': 2, 'subtotal': '10.00'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/cart/menu-items')
+        self.assertEqual(self.summary()['lines'], 0)
+
+    def test_deleting_a_menu_item_refreshes_the_summaries_of_carts_holding_it(self):
+        Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=1, unit_price=500, price=500,
+                            location=self.soup.location)
+        Cart.objects.create(user=self.customer, menuitem=self.salad, quantity=1, unit_price=500, price=500,
+                            location=self.salad.location)
+        self.assertEqual(cart_summary(self.soup.location_id, self.customer.id)['lines'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.delete()
+        self.assertEqual(self.summary(), {'lines': 1, 'items': 1, 'subtotal': '5.00'})
+
+
+class MenuItemPriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.item = MenuItem.objects.create(title='Soup', price=500, category=cls.category,
+                                           location=get_location(None))
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_prices_are_converted_to_cents_once(self):
+        for path in ['/api/menu-items', '/api/menu-items/']:
+            for price, cents in [('0.75', 75), ('5.00', 500), ('75', 7500), (12.5, 1250)]:
+                with self.subTest(path=path, price=price):
+                    title = 'Item {}'.format(price)
+                    response = self.client.post(path, {'title': title, 'price': price,
+                                                       'category': {'slug': 'mains', 'title': 'Mains'}},
+                                                format='json')
+                    self.assertEqual(response.status_code, 201, response.data)
+                    self.assertEqual(MenuItem.objects.get(title=title).price, cents)
+                    MenuItem.objects.filter(title=title).delete()
+
+    def test_updates_convert_prices_once(self):
+        path = '/api/menu-items/{}'.format(self.item.id)
+        self.assertEqual(self.client.put(path, {'title': 'Soup', 'price': '9.99', 'category': 'mains'},
+                                         format='json').status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, 999)
+
+        self.assertEqual(self.client.patch(path, {'price': '0.75'}, format='json').status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, 75)
+
+    def test_prices_out_of_range_are_rejected(self):
+        for path in ['/api/menu-items', '/api/menu-items/']:
+            for price in ['75.01', '-1', '1.234', 'abc']:
+                with self.subTest(path=path, price=price):
+                    response = self.client.post(path, {'title': 'Too much', 'price': price, 'category': 'mains'},
+                                                format='json')
+                    self.assertEqual(response.status_code, 400)
+        self.assertGreaterEqual(self.client.patch('/api/menu-items/{}'.format(self.item.id), {'price': '75.01'},
+                                                  format='json').status_code, 400)
+        self.assertFalse(MenuItem.objects.filter(title='Too much').exists())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, 500)
+
+
+class RepriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.cheap, cls.odd, cls.other = [MenuItem.objects.create(title=title, price=price, category=category,
+                                                                 location=location)
+                                         for title, price in (('Bread', 10), ('Soup', 105), ('Salad', 700))]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def prices(self) -> list:
+        return list(MenuItem.objects.order_by('id').values_list('price', flat=True))
+
+    def test_rounds_half_up_to_the_cent_and_reprices_carts(self):
+        Cart.objects.create(user=self.customer, menuitem=self.odd, quantity=3, unit_price=105, price=315,
+                            location=self.odd.location)
+
+        response = self.client.post('/api/menu-items/reprice', {'percent': 5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # 0.105 -> 0.11, 1.1025 -> 1.10, 7.35 -> 7.35
+        self.assertEqual(self.prices(), [11, 110, 735])
+        self.assertEqual(Cart.objects.values_list('unit_price', 'price').get(), (110, 330))
+
+    def test_form_encoded_ids(self):
+        response = self.client.post('/api/menu-items/reprice',
+                                    {'percent': '-50', 'ids': '{},{}'.format(self.cheap.id, self.odd.id)})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.prices(), [5, 53, 700])
+
+    def test_rejects_bad_input(self):
+        for data in [{'percent': 'inf'}, {'percent': 'Infinity'}, {'percent': 'nan'}, {'percent': '1e400'},
+                     {'percent': -101}, {'percent': 'abc'}, {'percent': True}, {'percent': 5, 'ids': ['x']},
+                     {'percent': 5, 'ids': [True]}, {'percent': 5, 'ids': [{'id': 1}]}, {'percent': 1000}]:
+            with self.subTest(data=data):
+                # ten calls a minute
+                cache.clear()
+                response = self.client.post('/api/menu-items/reprice', data, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.prices(), [10, 105, 700])
+
+
+class CatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup, cls.salad = [MenuItem.objects.create(title=title, price=500, category=category, location=location)
+                               for title in ('Soup', 'Salad')]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        catalogue._snapshots.clear()
+
+    def featured(self) -> list:
+        return [item['title'] for item in APIClient().get('/api/menu-items/featured').data['featured']]
+
+    def toggle(self, user, data):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post('/api/menu-items/featured/toggle', data, format='json')
+
+    def test_warm_snapshot_makes_no_queries(self):
+        self.featured()
+        with self.assertNumQueries(0):
+            self.featured()
+
+    def test_toggle_is_for_managers_only(self):
+        self.assertEqual(self.toggle(None, {'ids': [self.soup.id]}).status_code, 401)
+        self.assertEqual(self.toggle(self.customer, {'ids': [self.soup.id]}).status_code, 403)
+        self.assertEqual(self.featured(), [])
+
+        self.assertEqual(self.toggle(self.manager, {'ids': [self.soup.id, self.salad.id]}).status_code, 200)
+        self.assertEqual(self.featured(), ['Soup', 'Salad'])
+        self.assertEqual(self.toggle(self.manager, {'ids': str(self.soup.id), 'featured': False}).status_code, 200)
+        self.assertEqual(self.featured(), ['Salad'])
+
+    def test_versions_bumped_by_other_workers_reload_the_snapshot(self):
+        self.featured()
+        # another worker's write: the database and the shared version change, this process' snapshot doesn't
+        MenuItem.objects.filter(id=self.soup.id).update(featured=True)
+        self.assertEqual(self.featured(), [])
+        caches['shared'].set(catalogue.version_key(self.soup.location_id), 'moved on', None)
+        self.assertEqual(self.featured(), ['Soup'])
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        cls.driver = User.objects.create(username='driver', first_name='Dee')
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup = MenuItem.objects.create(title='Soup', price=500, category=cls.category, location=location)
+        cls.order = Order.objects.create(user=cls.customer, delivery_crew=cls.driver, total=500, date=timezone.now(),
+                                         location=location)
+        OrderItem.objects.create(order=cls.order, menuitem=cls.soup, quantity=1, unit_price=500, price=500)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def get(self, path):
+        # throttle history lives in the default cache
+        cache.clear()
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_menu_items(self):
+        category = {'id': self.category.id, 'slug': 'mains', 'title': 'Mains'}
+        self.assertEqual(self.get('/api/menu-items'), [{'id': self.soup.id, 'title': 'Soup', 'price': '5.00',
+                                                        'featured': False, 'category': category}])
+        for path in ['/api/menu-items', '/api/menu-items/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path + '?fields=id,category'),
+                                 [{'id': self.soup.id, 'category': self.category.id}])
+                self.assertEqual(self.get(path + '?fields=title,category&expand=category'),
+                                 [{'title': 'Soup', 'category': category}])
+                # expanding a relation that isn't rendered adds nothing
+                self.assertEqual(self.get(path + '?fields=price&expand=category'), [{'price': '5.00'}])
+        self.assertEqual(self.get('/api/menu-items/{}?fields=id,price'.format(self.soup.id)),
+                         {'id': self.soup.id, 'price': '5.00'})
+
+    def test_orders(self):
+        crew = {'id': self.driver.id, 'first_name': 'Dee', 'last_name': '', 'username': 'driver', 'email': ''}
+        items = [{'id': self.order.orderitem_set.get().id, 'quantity': 1, 'unit_price': '5.00', 'price': '5.00'}]
+        self.assertEqual(self.get('/api/orders')[0]['delivery_crew'], 'driver')
+        self.assertEqual(self.get('/api/orders?fields=id,status'), [{'id': self.order.id, 'status': False}])
+        self.assertEqual(self.get('/api/orders?fields=id,delivery_crew'),
+                         [{'id': self.order.id, 'delivery_crew': self.driver.id}])
+        self.assertEqual(self.get('/api/orders?fields=id,delivery_crew,orderitems&expand=delivery_crew'),
+                         [{'id': self.order.id, 'delivery_crew': crew, 'orderitems': items}])
+        self.assertEqual(self.get('/api/orders?expand=delivery_crew&history=true')[0]['delivery_crew'], crew)
+        self.assertEqual(self.get('/api/orders/{}?fields=id,orderitems'.format(self.order.id)),
+                         {'id': self.order.id, 'orderitems': items})
+
+    def test_unknown_names_are_rejected(self):
+        menu_error = 'fields: unknown field(s) \'bogus\', expected any of id, title, price, featured, category'
+        for path, error in [
+            ('/api/menu-items?fields=id,bogus', menu_error),
+            ('/api/menu-items/?fields=id,bogus', menu_error),
+            ('/api/menu-items/{}?fields=id,bogus'.format(self.soup.id), menu_error),
+            ('/api/menu-items?expand=title', 'expand: unknown field(s) \'title\', expected any of category'),
+            ('/api/orders?fields=id,user', 'fields: unknown field(s) \'user\', expected any of id, delivery_crew, '
+                                           'status, total, date, orderitems'),
+            ('/api/orders/{}?expand=status'.format(self.order.id),
+             'expand: unknown field(s) \'status\', expected any of delivery_crew'),
+        ]:
+            with self.subTest(path=path):
+                cache.clear()
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data.get('detail', response.data.get('error')), error)
+
+
+class RendererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup = MenuItem.objects.create(title='Soup', price=500, category=category, location=location)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def post_cart(self, body: bytes, content_type: str):
+        return self.client.post('/api/cart/menu-items', body, content_type=content_type,
+                                HTTP_ACCEPT='application/msgpack')
+
+    def test_renders_what_drf_would_turn_into_text(self):
+        data = {'price': Decimal('12.50'), 'label': gettext_lazy('Soup'), 1: None}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"price":"12.50","label":"Soup","1":null}')
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data), strict_map_key=False),
+                         {'price': '12.50', 'label': 'Soup', 1: None})
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_msgpack_round_trip(self):
+        response = self.post_cart(msgpack.packb({'menuitem': self.soup.id, 'quantity': 2}), 'application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {'message': 'cart updated'})
+
+        response = self.client.get('/api/cart/menu-items', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)[0]['price'], '10.00')
+
+    def test_malformed_json(self):
+        Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=1, unit_price=500, price=500,
+                            location=self.soup.location)
+        for path in ['/api/cart/menu-items', '/api/orders']:
+            for body in [b'{', b'\xff', b'[1,]', b'{"menuitem": 1,}']:
+                with self.subTest(path=path, body=body):
+                    cache.clear()
+                    response = self.client.post(path, body, content_type='application/json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('JSON parse error', response.json()['detail'])
+
+    def test_malformed_msgpack(self):
+        # truncated, reserved byte, trailing data, unhashable keys, extension types
+        for body in [b'\x92\x01', b'\xc1', b'\x01\x02', b'\x81\x90\x01', b'\x81\x80\x01', b'\xd4\x05\x00']:
+            with self.subTest(body=body):
+                cache.clear()
+                response = self.post_cart(body, 'application/msgpack')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('MessagePack parse error', msgpack.unpackb(response.content)['detail'])
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.bulk_create([MenuItem(title='Dish {}'.format(i), price=500 + i, category=category,
+                                               location=get_location(None)) for i in range(40)])
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        catalogue._compressed.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    @staticmethod
+    def middleware(response, **meta):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip', **meta)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiation_honors_refusals(self):
+        # negotiation only looks at the names, the codecs stand in for ones that may not be installed
+        codecs = {name: GzipCodec(6) for name in ('zstd', 'br', 'gzip')}
+        for header, expected in [('gzip', 'gzip'), ('GZIP;q=0.5', 'gzip'), ('*', 'zstd'), ('br;q=0, gzip', 'gzip'),
+                                 ('zstd;q=0, br;q=0.0, *', 'gzip'), ('gzip;q=0, *;q=0.1', 'zstd'),
+                                 ('gzip;q=0, *', 'zstd'), ('zstd;q=0, br;q=0, gzip;q=0, *', None),
+                                 ('*;q=0', None), ('identity', None), ('gzip;q=bogus', None), ('', None)]:
+            with self.subTest(header=header):
+                negotiated = negotiate(header, codecs)
+                self.assertEqual(negotiated and negotiated[0], expected)
+
+    def test_full_menu_is_compressed_once_per_body(self):
+        response = self.client.get('/api/menu-items', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = gzip.decompress(response.content)
+        self.assertEqual(len(json.loads(body)), 40)
+        self.assertIn(('gzip', body), catalogue._compressed)
+
+        cache.clear()
+        with mock.patch.object(GzipCodec, 'compress', side_effect=AssertionError('compressed again')):
+            self.assertEqual(self.client.get('/api/menu-items', HTTP_ACCEPT_ENCODING='gzip').content,
+                             response.content)
+
+    def test_small_and_refused_responses_are_sent_as_they_are(self):
+        response = self.client.get('/api/menu-items/featured', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get('/api/menu-items', HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0, zstd;q=0, *')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.json()), 40)
+
+    def test_pages_with_secrets_are_not_compressed(self):
+        # the browsable API renders the CSRF token next to the reflected search text
+        client = Client()
+        client.force_login(self.customer)
+        response = client.get('/api/menu-items?search=secret-probe', HTTP_ACCEPT='text/html',
+                              HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.content), settings.COMPRESSION_MIN_SIZE)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'secret-probe', response.content)
+
+        body = json.dumps(['x'] * 1000)
+        self.assertFalse(self.middleware(HttpResponse(body, content_type='text/html; charset=utf-8'))
+                         .has_header('Content-Encoding'))
+        self.assertFalse(self.middleware(HttpResponse(body, content_type='application/json'),
+                                         CSRF_COOKIE_NEEDS_UPDATE=True).has_header('Content-Encoding'))
+        self.assertEqual(self.middleware(HttpResponse(body, content_type='application/json'))['Content-Encoding'],
+                         'gzip')
+
+    def test_streamed_chunks_are_flushed_as_they_come(self):
+        response = self.middleware(StreamingHttpResponse(iter([b'a' * 10, b'', b'b' * 10]),
+                                                         content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = list(response.streaming_content)
+        self.assertEqual(decompressor.decompress(chunks[0]), b'a' * 10)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), b'a' * 10 + b'b' * 10)
+
+    @skipUnless(django.VERSION >= (4, 2), 'asynchronous streaming responses need Django 4.2')
+    def test_async_streamed_responses(self):
+        async def content():
+            for chunk in [b'a' * 10, b'b' * 10]:
+                yield chunk
+
+        async def consume(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        response = self.middleware(StreamingHttpResponse(content(), content_type='application/json'))
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(asyncio.run(consume(response))), b'a' * 10 + b'b' * 10)
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup, cls.salad = [MenuItem.objects.create(title=title, price=500, category=category, location=location)
+                               for title in ('Soup', 'Salad')]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def post(self, key, menuitem):
+        cache.clear()
+        return self.client.post('/api/cart/menu-items', {'menuitem': menuitem.id, 'quantity': 1}, format='json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post('abc', self.soup)
+        retry = self.post('abc', self.soup)
+        self.assertEqual((first.status_code, first.json()), (200, {'message': 'cart updated'}))
+        self.assertEqual((retry.status_code, retry.json()), (200, {'message': 'cart updated'}))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.post('abc', self.soup)
+        response = self.post('abc', self.salad)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 1)
+
+    def test_expired_keys_run_the_view_again(self):
+        self.post('abc', self.soup)
+        expired = timezone.now() - datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL, minutes=1)
+        IdempotencyKey.objects.update(created_at=expired)
+        Cart.objects.all().delete()
+
+        response = self.post('abc', self.salad)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(list(Cart.objects.values_list('menuitem', flat=True)), [self.salad.id])
+        self.assertEqual(self.post('abc', self.salad)['Idempotent-Replayed'], 'true')
+
+    def test_concurrent_duplicate_replays_the_winner(self):
+        duplicate = []
+
+        def lose_the_race(request):
+            # the duplicate commits its key while this request is on its way to insert the same one
+            if not duplicate:
+                duplicate.append(None)
+                duplicate[0] = self.post('abc', self.soup)
+            return request_hash(request)
+
+        with mock.patch('littlelemon.idempotency.request_hash', side_effect=lose_the_race):
+            response = self.post('abc', self.soup)
+        self.assertFalse(duplicate[0].has_header('Idempotent-Replayed'))
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(response.json(), duplicate[0].json())
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 1)
+
+    def test_database_errors_outside_a_savepoint_store_nothing(self):
+        def fail(*args, **kwargs):
+            User.objects.create(username=self.customer.username)
+
+        with mock.patch.object(MenuItem.objects, 'filter', side_effect=fail):
+            response = self.post('abc', self.soup)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('abc', self.soup).status_code, 200)
+
+
+class RoleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.managers = Group.objects.create(name='Manager')
+        Group.objects.create(name='Delivery Crew')
+        cls.manager, cls.other = User.objects.create(username='manager'), User.objects.create(username='other')
+        cls.managers.user_set.add(cls.manager, cls.other)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+
+    def change(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+
+    def test_roles_are_shared_until_membership_changes(self):
+        self.assertEqual(user_roles(self.other), {'Manager'})
+        self.assertEqual(caches['users'].get(role_cache_key(self.other.id)), {'Manager'})
+        with self.assertNumQueries(0):
+            user_roles(self.other)
+
+        for func, args in [(self.other.groups.clear, ()), (self.managers.user_set.add, (self.other,)),
+                           (self.managers.user_set.remove, (self.other,)), (self.other.groups.add, (self.managers,)),
+                           (self.managers.user_set.clear, ())]:
+            with self.subTest(func=func.__qualname__):
+                user_roles(self.other)
+                self.change(func, *args)
+                self.assertEqual(user_roles(self.other), set(self.other.groups.values_list('name', flat=True)))
+        self.assertEqual(user_roles(self.manager), frozenset())
+
+    def test_removed_managers_lose_access_right_away(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get('/api/profiles').status_code, 200)
+
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete('/api/groups/manager/users/{}'.format(self.other.id)).status_code, 200)
+
+        client = APIClient()
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get('/api/profiles').status_code, 403)
+
+    def test_views_check_roles_through_the_cache(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get('/api/orders').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/orders').status_code, 200)
+        self.assertFalse(any('auth_user_groups' in query['sql'] for query in queries.captured_queries))
+
+        self.change(self.managers.user_set.remove, self.other)
+        self.assertEqual(client.get('/api/orders').status_code, 403)
+
+    def test_error_keys(self):
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        for path, key in [('/api/groups/manager/users', 'error'), ('/api/groups/delivery-crew/users', 'message')]:
+            with self.subTest(path=path):
+                for data, status in [({}, 400), ({'id': 'x'}, 400), ({'username': 'nobody'}, 404)]:
+                    response = client.post(path, data, format='json')
+                    self.assertEqual(response.status_code, status)
+                    self.assertEqual(list(response.json()), [key])
+                cache.clear()
+
+
+@override_settings(ORDER_SLOT_CAPACITY=1, ORDER_SLOT_HOURS=(0, 24))
+class SlotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customers = Group.objects.create(name='Customer')
+        cls.first, cls.second = User.objects.create(username='first'), User.objects.create(username='second')
+        customers.user_set.add(cls.first, cls.second)
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup = MenuItem.objects.create(title='Soup', price=500, category=category, location=location)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.due = (timezone.localtime() + datetime.timedelta(days=1)).replace(hour=12, minute=0, second=0,
+                                                                               microsecond=0)
+
+    def request(self, user, method, path, data=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(client, method)(path, data, format='json')
+
+    def order(self, user, date=None):
+        Cart.objects.get_or_create(user=user, menuitem=self.soup,
+                                   defaults={'quantity': 1, 'unit_price': 500, 'price': 500,
+                                             'location': self.soup.location})
+        return self.request(user, 'post', '/api/orders', {'date': date.isoformat()} if date else {})
+
+    def test_full_slots_answer_409_until_an_order_is_deleted(self):
+        self.assertEqual(self.order(self.first, self.due).status_code, 201)
+        response = self.order(self.second, self.due + datetime.timedelta(minutes=5))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('fully booked', response.json()['message'])
+        self.assertTrue(Cart.objects.filter(user=self.second).exists())
+        self.assertEqual(self.order(self.second, self.due + datetime.timedelta(minutes=15)).status_code, 201)
+
+        slot = TimeSlot.objects.get(start=self.due)
+        self.assertEqual((slot.booked, slot.capacity), (1, 1))
+        order = Order.objects.get(user=self.first)
+        self.assertEqual(order.total, 500)
+        self.assertEqual(self.request(self.manager, 'delete', '/api/orders/{}'.format(order.id)).status_code, 200)
+        slot.refresh_from_db()
+        self.assertEqual(slot.booked, 0)
+        self.assertEqual(self.order(self.second, self.due).status_code, 201)
+
+    def test_slot_listing_follows_bookings(self):
+        client = APIClient()
+        client.force_authenticate(self.second)
+
+        def available():
+            # the listing stays cached between calls, bookings and deletions have to clear it
+            slots = client.get('/api/orders/slots?date={}'.format(self.due.date())).json()
+            return next(slot['available'] for slot in slots if slot['start'] == self.due.isoformat())
+
+        self.assertEqual(available(), 1)
+        self.assertEqual(available(), 1)
+        self.order(self.first, self.due)
+        self.assertEqual(available(), 0)
+        order = Order.objects.get(user=self.first)
+        self.request(self.manager, 'delete', '/api/orders/{}'.format(order.id))
+        self.assertEqual(available(), 1)
+
+    def test_orders_due_now_need_opening_hours(self):
+        hour = timezone.localtime().hour
+        closed = (hour + 1, 24) if hour < 12 else (0, hour)
+        with override_settings(ORDER_SLOT_HOURS=closed):
+            response = self.order(self.first)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('schedule one with date', response.json()['message'])
+        self.assertFalse(TimeSlot.objects.exists())
+
+        self.assertEqual(self.order(self.first).status_code, 201)
+        self.assertEqual(TimeSlot.objects.get().booked, 1)
+
+    def test_admin_keeps_capacity_above_bookings(self):
+        slot = TimeSlot.objects.create(location=get_location(None), start=self.due, capacity=5, booked=3)
+        for capacity, valid in [(2, False), (-1, False), (3, True), (10, True)]:
+            with self.subTest(capacity=capacity):
+                form = TimeSlotForm({'location': slot.location_id, 'start': self.due, 'capacity': capacity},
+                                    instance=slot)
+                self.assertEqual(form.is_valid(), valid, form.errors)
+
+
+class CleanupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Customer').user_set.add(*[User.objects.create(username=name)
+                                                            for name in ('stale', 'mixed', 'fresh')])
+        cls.stale, cls.mixed, cls.fresh = User.objects.order_by('id')
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup, cls.salad = [MenuItem.objects.create(title=title, price=500, category=category, location=location)
+                               for title in ('Soup', 'Salad')]
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.old = timezone.now() - datetime.timedelta(days=settings.ABANDONED_CART_DAYS + 1)
+
+    def add_to_cart(self, user, menuitem, created_at=None):
+        line = Cart.objects.create(user=user, menuitem=menuitem, quantity=1, unit_price=500, price=500,
+                                   location=menuitem.location)
+        if created_at:
+            Cart.objects.filter(id=line.id).update(created_at=created_at)
+
+    def cleanup(self, *args) -> str:
+        out = io.StringIO()
+        call_command('cleanup_stale_data', '--batch-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_purges_what_went_stale(self):
+        self.add_to_cart(self.stale, self.soup, self.old)
+        self.add_to_cart(self.stale, self.salad, self.old)
+        self.add_to_cart(self.mixed, self.soup, self.old)
+        self.add_to_cart(self.mixed, self.salad)
+        self.add_to_cart(self.fresh, self.soup)
+
+        for key, created_at in [('old', self.old), ('new', timezone.now())]:
+            IdempotencyKey.objects.create(user=self.fresh, key=key, request_hash='')
+            IdempotencyKey.objects.filter(key=key).update(created_at=created_at)
+        for status, finished_at in [(Task.DONE, self.old), (Task.DONE, timezone.now()), (Task.FAILED, self.old)]:
+            Task.objects.create(name='record', status=status, finished_at=finished_at)
+        Session.objects.create(session_key='expired', session_data='', expire_date=self.old)
+        Session.objects.create(session_key='current', session_data='',
+                               expire_date=timezone.now() + datetime.timedelta(days=1))
+
+        out = self.cleanup()
+        self.assertEqual(sorted(Cart.objects.values_list('user__username', flat=True)), ['fresh', 'mixed', 'mixed'])
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+        self.assertEqual(sorted(Task.objects.values_list('status', flat=True)), [Task.DONE, Task.FAILED])
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+        for line in ['cart lines:        2 rows', 'idempotency keys:        1 rows', 'finished tasks:        1 rows',
+                     'sessions:        1 rows', 'reclaimed 5 rows']:
+            self.assertIn(line, out)
+
+        self.assertIn('cart lines:        3 rows', self.cleanup('--cart-days=0'))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_reordered_carts_are_not_abandoned(self):
+        order = Order.objects.create(user=self.stale, total=500, date=timezone.now(), location=self.soup.location)
+        OrderItem.objects.create(order=order, menuitem=self.soup, quantity=2, unit_price=500, price=1000)
+        self.add_to_cart(self.stale, self.soup, self.old)
+
+        client = APIClient()
+        client.force_authenticate(self.stale)
+        self.assertEqual(client.post('/api/orders/{}/reorder'.format(order.id)).status_code, 200)
+        self.assertIn('cart lines:        0 rows', self.cleanup())
+        self.assertEqual(Cart.objects.get(user=self.stale).quantity, 2)
+
+
+class ReorderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        category = Category.objects.create(slug='mains', title='Mains')
+        location = get_location(None)
+        cls.soup, cls.salad, cls.bread = [MenuItem.objects.create(title=title, price=price, category=category,
+                                                                  location=location)
+                                          for title, price in (('Soup', 500), ('Salad', 700), ('Bread', 100))]
+        cls.order = Order.objects.create(user=cls.customer, total=1900, date=timezone.now(), location=location)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=cls.order, menuitem=cls.soup, quantity=1, unit_price=400, price=400),
+            OrderItem(order=cls.order, menuitem=cls.salad, quantity=2, unit_price=700, price=1400),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+
+    def client_for(self, user) -> APIClient:
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def remove(self, menuitem):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.manager).delete('/api/menu-items/{}'.format(menuitem.id))
+        self.assertEqual(response.status_code, 200)
+
+    def reorder(self, order_id):
+        return self.client_for(self.customer).post('/api/orders/{}/reorder'.format(order_id))
+
+    def test_copies_the_order_at_current_prices(self):
+        response = self.reorder(self.order.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unavailable'], [])
+        self.assertEqual(sorted(Cart.objects.filter(user=self.customer).values_list('menuitem', 'quantity', 'price')),
+                         [(self.soup.id, 1, 500), (self.salad.id, 2, 1400)])
+
+    def test_ordered_items_are_taken_off_the_menu_and_reported_unavailable(self):
+        Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=1, unit_price=500, price=500,
+                            location=self.soup.location)
+        self.remove(self.soup)
+        self.remove(self.bread)
+
+        # never ordered, so nothing refers to it any more
+        self.assertFalse(MenuItem.objects.filter(id=self.bread.id).exists())
+        self.soup.refresh_from_db()
+        self.assertFalse(self.soup.available)
+        self.assertEqual(self.order.orderitem_set.count(), 2)
+        self.assertFalse(Cart.objects.filter(menuitem=self.soup).exists())
+        menu = self.client_for(self.customer).get('/api/menu-items').data
+        self.assertEqual([item['title'] for item in menu], ['Salad'])
+        self.assertEqual(self.client_for(self.customer).post('/api/cart/menu-items',
+                                                             {'menuitem': self.soup.id, 'quantity': 1},
+                                                             format='json').status_code, 404)
+
+        response = self.reorder(self.order.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unavailable'], [self.soup.id])
+        self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('menuitem', flat=True)),
+                         [self.salad.id])
+
+    def test_orders_of_removed_items_only_are_found(self):
+        self.remove(self.soup)
+        self.remove(self.salad)
+
+        response = self.reorder(self.order.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['unavailable']), [self.soup.id, self.salad.id])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.reorder(self.order.id + 1).status_code, 404)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.customer = User.objects.create(username='customer')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = override_settings(PROFILING_ENABLED=True, PROFILING_PATHS=['/api/orders'],
+                                          PROFILING_SAMPLE_RATE=0, PROFILING_SLOW_MS=10 ** 6,
+                                          PROFILING_DIR=directory.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def get(self, user=None, token=None, **headers):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        if token:
+            client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        with mock.patch('littlelemon.middleware.cProfile.Profile', wraps=cProfile.Profile) as profile:
+            response = client.get('/api/orders', **header_meta(headers))
+        return response, profile.called
+
+    def test_header_is_honored_for_managers_only(self):
+        token = Token.objects.create(user=self.customer).key
+        for user, token in [(None, None), (self.customer, None), (None, token), (None, 'bogus')]:
+            with self.subTest(user=user, token=token):
+                response, profiled = self.get(user, token, **{'X-Profile': '1'})
+                self.assertFalse(profiled)
+                self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(list_profiles(), [])
+
+        for user, token in [(self.manager, None), (None, Token.objects.create(user=self.manager).key)]:
+            with self.subTest(user=user, token=token):
+                response, profiled = self.get(user, token, **{'X-Profile': '1'})
+                self.assertTrue(profiled)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(response['X-Profile'], [profile['name'] for profile in list_profiles()])
+
+    def test_sampled_requests_keep_slow_profiles_only(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            self.assertTrue(self.get(self.customer)[1])
+            self.assertEqual(list_profiles(), [])
+            with override_settings(PROFILING_SLOW_MS=0):
+                response, profiled = self.get(self.customer, **{'X-Profile': '1'})
+        self.assertTrue(profiled)
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual([profile['path'] for profile in list_profiles()], ['/api/orders'])
+
+    def test_other_paths_and_disabled_profiling(self):
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        self.assertFalse(client.get('/api/menu-items', HTTP_X_PROFILE='1').has_header('X-Profile'))
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertFalse(self.get(self.manager, **{'X-Profile': '1'})[1])
+
+
+class LocationTests(TestCase):
+    """Requests only see and change the rows of their own location."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.manager = User.objects.create(username='customer'), User.objects.create(username='manager')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.main = get_location(None)
+        cls.harbour = Location.objects.create(slug='harbour', name='Harbour')
+        cls.soup = MenuItem.objects.create(title='Soup', price=500, category=category, location=cls.main)
+        cls.chowder = MenuItem.objects.create(title='Chowder', price=900, category=category, location=cls.harbour)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+
+    @staticmethod
+    def client_at(location, user) -> APIClient:
+        client = APIClient(HTTP_X_LOCATION=location.slug)
+        client.force_authenticate(user)
+        return client
+
+    def test_the_migration_creates_the_default_location(self):
+        self.assertTrue(Location.objects.filter(slug=settings.DEFAULT_LOCATION).exists())
+        self.assertFalse(MenuItem._meta.get_field('location').has_default())
+
+    def test_locations_are_cached_for_every_worker(self):
+        self.assertEqual(get_location('harbour'), self.harbour)
+        self.assertIn('harbour', caches['shared'].get(LOCATIONS_KEY))
+        with self.assertNumQueries(0):
+            get_location('harbour')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(slug='pier', name='Pier')
+        self.assertIsNone(caches['shared'].get(LOCATIONS_KEY))
+        self.assertEqual(get_location('pier').name, 'Pier')
+
+    def test_carts_are_kept_per_location(self):
+        for menuitem in (self.soup, self.chowder):
+            Cart.objects.create(user=self.customer, menuitem=menuitem, quantity=1, unit_price=menuitem.price,
+                                price=menuitem.price, location=menuitem.location)
+        main, harbour = self.client_at(self.main, self.customer), self.client_at(self.harbour, self.customer)
+        self.assertEqual([line['menuitem'] for line in harbour.get('/api/cart/menu-items').json()], [self.chowder.id])
+        self.assertEqual(harbour.get('/api/cart/summary').json(), {'lines': 1, 'items': 1, 'subtotal': '9.00'})
+        self.assertEqual(main.get('/api/cart/summary').json(), {'lines': 1, 'items': 1, 'subtotal': '5.00'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(harbour.delete('/api/cart/menu-items').status_code, 200)
+        self.assertEqual(list(Cart.objects.values_list('menuitem', flat=True)), [self.soup.id])
+        self.assertEqual(harbour.get('/api/cart/summary').json()['lines'], 0)
+        self.assertEqual(main.get('/api/cart/summary').json()['lines'], 1)
+
+    def test_managers_only_change_their_own_location(self):
+        order = Order.objects.create(user=self.customer, total=900, date=timezone.now(), location=self.harbour)
+        ticket = PreparationTicket.objects.create(order=order, menuitem=self.chowder, quantity=1,
+                                                  location=order.location)
+        client = self.client_at(self.main, self.manager)
+        for method, path, data in [
+            ('put', '/api/menu-items/{}'.format(self.chowder.id),
+             {'title': 'Gone', 'price': '1.00', 'category': 'mains'}),
+            ('patch', '/api/menu-items/{}'.format(self.chowder.id), {'price': '1.00'}),
+            ('delete', '/api/menu-items/{}'.format(self.chowder.id), None),
+            ('put', '/api/orders/{}'.format(order.id), {'status': 1, 'delivery_crew': 'null'}),
+            ('patch', '/api/orders/{}'.format(order.id), {'status': 1}),
+            ('delete', '/api/orders/{}'.format(order.id), None),
+            ('patch', '/api/kitchen/tickets/{}'.format(ticket.id), {'done': True}),
+        ]:
+            with self.subTest(method=method, path=path):
+                cache.clear()
+                self.assertIn(getattr(client, method)(path, data, format='json').status_code, (400, 404))
+        self.assertEqual(MenuItem.objects.values_list('title', 'price').get(id=self.chowder.id), ('Chowder', 900))
+        self.assertFalse(Order.objects.get(id=order.id).status)
+        self.assertFalse(PreparationTicket.objects.get(id=ticket.id).done)
+
+        client = self.client_at(self.harbour, self.manager)
+        self.assertEqual(client.patch('/api/kitchen/tickets/{}'.format(ticket.id), {'done': True},
+                                      format='json').status_code, 200)
+        self.assertEqual(client.delete('/api/orders/{}'.format(order.id)).status_code, 200)
+
+
+@override_settings(LOCATION_DATABASES={'uptown': 'uptown'})
+class LocationRouterTests(SimpleTestCase):
+    def test_location_databases_get_the_location_tables_only(self):
+        router = LocationShardRouter()
+        for app_label, model_name in [('littlelemon', 'order'), ('littlelemon', 'category'), ('auth', 'user'),
+                                      ('contenttypes', 'contenttype')]:
+            self.assertIs(router.allow_migrate('uptown', app_label, model_name), True)
+        for app_label, model_name in [('sessions', 'session'), ('authtoken', 'token'), ('admin', 'logentry')]:
+            self.assertIs(router.allow_migrate('uptown', app_label, model_name), False)
+        # everything else is up to the next router
+        self.assertIsNone(router.allow_migrate('default', 'sessions', 'session'))
+
+    def test_routes_the_location_tables_to_the_location_database(self):
+        router = LocationShardRouter()
+        uptown = Location(slug='uptown')
+        with at_location(uptown):
+            for model in (MenuItem, Cart, Order, PreparationTicket, TimeSlot, Task, IdempotencyKey):
+                self.assertEqual(router.db_for_write(model), 'uptown')
+            for model in (User, Location, Category, Session):
+                self.assertIsNone(router.db_for_write(model))
+        self.assertEqual(router.db_for_read(Order), 'default')
+
+
+class LocationDatabaseSettingsTests(SimpleTestCase):
+    def test_location_database_suites(self):
+        # the suites below are skipped without the uptown database, run them under the settings that add it
+        result = subprocess.run([sys.executable, 'manage.py', 'test', '--noinput',
+                                 'littlelemon.tests.LocationDatabaseTests', 'littlelemon.tests.UptownQueryCountTests'],
+                                cwd=settings.BASE_DIR,
+                                env=dict(os.environ, DJANGO_SETTINGS_MODULE='api.settings_locations'),
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn('skipped', result.stderr)
+
+
+@skipUnless('uptown' in settings.DATABASES, 'needs the uptown database, see LocationDatabaseSettingsTests')
+@override_settings(ORDER_SLOT_HOURS=(0, 24))
+class LocationDatabaseTests(TestCase):
+    """A location with a database of its own, the uptown database of api.settings_locations."""
+    # naming 'uptown' would fail the whole run under settings without it, skipped or not
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer', email='customer@example.com', password='secret')
+        Group.objects.create(name='Customer').user_set.add(cls.customer)
+        cls.manager = User.objects.create(username='manager')
+        Group.objects.create(name='Manager').user_set.add(cls.manager)
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.uptown = Location.objects.create(slug='uptown', name='Uptown')
+        replicate_all()
+        with at_location(cls.uptown):
+            cls.soup = MenuItem.objects.create(title='Soup', price=500, category=cls.category, location=cls.uptown)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        caches['users'].clear()
+        self.client = APIClient(HTTP_X_LOCATION='uptown')
+        self.client.force_authenticate(self.customer)
+
+    def post(self, path, data=None, **headers):
+        with self.captureOnCommitCallbacks(using='uptown', execute=True):
+            return self.client.post(path, data, format='json', **header_meta(headers))
+
+    def add_to_cart(self):
+        self.assertEqual(self.post('/api/cart/menu-items', {'menuitem': self.soup.id, 'quantity': 2}).status_code,
+                         200)
+
+    def test_checkout_writes_the_location_database_only(self):
+        self.add_to_cart()
+        self.assertEqual(self.post('/api/orders', {}, **{'Idempotency-Key': 'abc'}).status_code, 201)
+
+        for model in (Order, OrderItem, PreparationTicket, TimeSlot, Task, IdempotencyKey):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.using('uptown').count(), 1)
+                self.assertFalse(model.objects.using('default').exists())
+        self.assertFalse(Cart.objects.using('uptown').exists())
+        self.assertEqual(self.client.get('/api/cart/summary').json()['lines'], 0)
+
+        # the receipt task finds the order and the customer's copy in the uptown database
+        call_command('run_tasks', '--once', stdout=io.StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['customer@example.com']])
+
+    def test_failed_checkout_keeps_the_cart(self):
+        self.add_to_cart()
+        with mock.patch('littlelemon.views.send_order_receipt.enqueue', side_effect=DatabaseError('queue is down')):
+            self.assertEqual(self.post('/api/orders', {}).status_code, 400)
+
+        self.assertEqual(Cart.objects.using('uptown').count(), 1)
+        for model in (Order, OrderItem, PreparationTicket, TimeSlot, Task):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.using('uptown').exists())
+
+    def test_reorders_and_repricing_read_the_location_menu(self):
+        self.add_to_cart()
+        self.post('/api/orders', {})
+        manager = APIClient(HTTP_X_LOCATION='uptown')
+        manager.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(using='uptown', execute=True):
+            self.assertEqual(manager.post('/api/menu-items/reprice', {'percent': 10}, format='json').status_code, 200)
+
+        order = Order.objects.using('uptown').get()
+        self.assertEqual(self.post('/api/orders/{}/reorder'.format(order.id)).status_code, 200)
+        self.assertEqual(Cart.objects.using('uptown').values_list('unit_price', 'price').get(), (550, 1100))
+
+    def test_copies_follow_the_default_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            late = User.objects.create(username='late', password='secret')
+        self.assertEqual(User.objects.using('uptown').values_list('username', 'password').get(id=late.id),
+                         ('late', '!'))
+        # a user registered after the last sync can check out right away
+        self.client.force_authenticate(late)
+        Group.objects.get(name='Customer').user_set.add(late)
+        self.add_to_cart()
+        self.assertEqual(Cart.objects.using('uptown').get().user_id, late.id)
+
+        # and takes their carts with them when deleted
+        with self.captureOnCommitCallbacks(execute=True):
+            late.delete()
+        self.assertFalse(User.objects.using('uptown').filter(id=late.id).exists())
+        self.assertFalse(Cart.objects.using('uptown').exists())
+
+    def test_sync_locations_copies_what_signals_missed(self):
+        User.objects.bulk_create([User(username='bulk-{}'.format(i)) for i in range(3)])
+        User.objects.using('uptown').bulk_create([User(id=10 ** 6, username='gone')])
+
+        call_command('sync_locations', '--batch-size=2', stdout=io.StringIO())
+        self.assertEqual(list(User.objects.using('uptown').order_by('id').values_list('id', 'username')),
+                         list(User.objects.order_by('id').values_list('id', 'username')))
+        tables = connections['uptown'].introspection.table_names()
+        self.assertIn('littlelemon_order', tables)
+        self.assertNotIn('django_session', tables)
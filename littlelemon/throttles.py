@@ -10,4 +10,8 @@ class FiveCallsPerMinute(UserRateThrottle):
 
 
 class OneCallsPerMinute(UserRateThrottle):
-    scope = 'one'
\ No newline at end of file
+    scope = 'one'
+
+
+class SixtyCallsPerMinute(UserRateThrottle):
+    scope = 'sixty'
\ No newline at end of file
@@ -10,6 +10,9 @@ urlpatterns = [
             'list': 'list',
         })),
     path('menu-items/<int:pk>', views.MenuItemView.as_view()),
+    path('menu-items/reprice', views.reprice_menu_items),
+    path('menu-items/featured', views.featured_menu_items),
+    path('menu-items/featured/toggle', views.toggle_featured_menu_items),
     path('categories', views.CategoryViewset.as_view({
             'get': 'list',
             'post': 'create',
@@ -19,7 +22,15 @@ urlpatterns = [
     path('groups/delivery-crew/users', views.delivery_list_assign),
     path('groups/delivery-crew/users/<int:pk>', views.delivery_remove),
     path('cart/menu-items', views.cart_view),
+    path('cart/summary', views.cart_summary_view),
     path('cart/orders', views.OrdersView.as_view()),
     path('orders', views.OrdersView.as_view()),
+    path('orders/slots', views.order_slots),
     path('orders/<int:pk>', views.OrderView.as_view()),
+    path('orders/<int:pk>/reorder', views.reorder_view),
+    path('kitchen/queue', views.kitchen_queue),
+    path('kitchen/tickets', views.kitchen_tickets),
+    path('kitchen/tickets/<int:pk>', views.kitchen_ticket_done),
+    path('profiles', views.profiles_list),
+    path('profiles/<str:name>', views.profile_detail),
 ]
\ No newline at end of file
@@ -1,39 +1,64 @@
-import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import chain
 
 from django.contrib.auth.models import User, Group
 from django.core import exceptions
+from django.db import router, transaction
+from django.db.models import F, Q, Sum
 from django.db.utils import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
 from django.utils.datastructures import MultiValueDictKeyError
 from rest_framework import generics, viewsets
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 
-from .helper_functions import build_order_item_list, attempt_parse_as_boolean, is_null_string
-from .models import MenuItem, Category, Cart, Order, OrderItem
+from .catalogue import CatalogueVariantMixin, featured_items, daily_special, bump_version, remove_item
+from .fieldsets import SparseFieldsetViewMixin, sparse_fieldset
+from .groups import user_identifiers, find_users, add_to_group, remove_from_group
+from .helper_functions import attempt_parse_as_boolean, is_null_string, order_representation, with_order_details, \
+    cart_summary, invalidate_cart_summary, id_list, ORDER_FIELDS
+from .idempotency import idempotent
+from .kitchen import create_tickets, last_position, remove_tickets, set_done
+from .locations import LocationScopedViewMixin, order_db, order_transaction
+from .models import MenuItem, Category, Cart, Order, OrderItem, ArchivedOrder, PreparationTicket, RemovedTicket
+from .pagination import GroupMembersPagination
 from .permissions import IsCustomer, IsManager
-from .serializers import MenuItemSerializer, CategorySerializer, UserSerializer, CartSerializer, OrderSerializer
-from .throttles import TenCallsPerMinute
-
-
-class MenuItemsListView(generics.ListCreateAPIView):
-    queryset = MenuItem.objects.all()
+from .pricing import reprice_carts, reprice_menu
+from .profiling import list_profiles, profile_report
+from .reorder import reorder
+from .roles import user_roles
+from .serializers import MenuItemSerializer, CategorySerializer, UserSerializer, CartSerializer, OrderSerializer, \
+    PreparationTicketSerializer
+from .slots import SlotFull, book_slot, check_open, check_schedule, release_slot, slot_availability
+from .tasks import send_order_receipt
+from .throttles import TenCallsPerMinute, SixtyCallsPerMinute
+
+
+class MenuItemsListView(CatalogueVariantMixin, LocationScopedViewMixin, SparseFieldsetViewMixin,
+                        generics.ListCreateAPIView):
+    queryset = MenuItem.objects.filter(available=True)
     serializer_class = MenuItemSerializer
+    sparse_relations = {'category': CategorySerializer.Meta.fields}
     permission_classes = [IsAuthenticated]
     ordering_fields = ['category', 'title', 'price']
     search_fields = ['category__title']
     throttle_classes = [TenCallsPerMinute]
 
     def post(self, request, **kwargs):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'Unauthorized Access'}, status=403)
 
         try:
             serial_item = MenuItemSerializer()
-            valid_data = serial_item.validate(request.data)
-            if MenuItem.objects.filter(title=valid_data['title']).exists():
+            valid_data = serial_item.validate(MenuItemSerializer.parse_input(request.data))
+            if MenuItem.objects.filter(title=valid_data['title'], location=request.location, available=True).exists():
                 return Response({'message': 'Menu item \'{}\' already exists'}, status=400)
+            valid_data['location'] = request.location
             new_item = serial_item.create(valid_data)
             new_item.save()
             return Response({'message': 'menu item successfully created'}, status=201)
@@ -41,47 +66,57 @@ class MenuItemsListView(generics.ListCreateAPIView):
             return Response({'error': str(e)}, status=400)
 
 
-class MenuItemsViewset(viewsets.ModelViewSet):
-    queryset = MenuItem.objects.all()
+class MenuItemsViewset(CatalogueVariantMixin, LocationScopedViewMixin, SparseFieldsetViewMixin,
+                       viewsets.ModelViewSet):
+    queryset = MenuItem.objects.filter(available=True)
     serializer_class = MenuItemSerializer
+    sparse_relations = {'category': CategorySerializer.Meta.fields}
     ordering_fields = ['category', 'title', 'price']
     search_fields = ['category__title']
     throttle_classes = [TenCallsPerMinute]
 
+    def perform_create(self, serializer):
+        serializer.save(location=self.request.location)
 
-class MenuItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+
+class MenuItemView(LocationScopedViewMixin, SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MenuItem.objects.filter(available=True)
     serializer_class = MenuItemSerializer
+    sparse_relations = {'category': CategorySerializer.Meta.fields}
     permission_classes = [IsAuthenticated]
     throttle_classes = [TenCallsPerMinute]
     lookup_field = 'id'
 
     def get(self, request, pk):
         try:
-            item = MenuItem.objects.get(pk=pk)
-            return Response(self.serializer_class(item).data, status=200)
+            item = self.get_queryset().get(pk=pk)
+            return Response(self.get_serializer(item).data, status=200)
         except MenuItem.DoesNotExist:
             return Response({'error': 'no MenuItem with id {}'.format(pk)}, status=404)
 
     def post(self, request, pk):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'Unauthorized Access'}, status=403)
         return Response({'message': '\'POST\' not supported for this endpoint'}, status=400)
 
     def put(self, request, pk):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'Unauthorized Access'}, status=403)
 
         try:
-            item = MenuItem.objects.get(pk=pk)
+            item = self.get_queryset().get(pk=pk)
             serial_item = MenuItemSerializer()
-            valid_data = serial_item.validate(request.data)
+            valid_data = serial_item.validate(MenuItemSerializer.parse_input(request.data))
 
+            price_changed = item.price != valid_data['price']
             item.title = valid_data['title']
             item.price = valid_data['price']
             item.category = Category.objects.get(id=valid_data['category'])
 
-            item.save()
+            with transaction.atomic(using=item._state.db):
+                item.save()
+                if price_changed:
+                    reprice_carts(MenuItem.objects.filter(id=item.id))
             return Response({'message': 'Menu item \'{}\' successfully updated'.format(item.title)}, status=200)
         except ValidationError as e:
             return Response({'message': str(e)}, status=400)
@@ -89,18 +124,22 @@ class MenuItemView(generics.RetrieveUpdateDestroyAPIView):
             return Response({'message': 'Menu item \'{}\' does not exist'.format(pk)}, status=400)
 
     def patch(self, request, pk):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'Unauthorized Access'}, status=403)
 
         try:
-            item = MenuItem.objects.get(pk=pk)
-            data = MenuItemSerializer.validate_partial_data(request.data)
+            item = self.get_queryset().get(pk=pk)
+            data = MenuItemSerializer.validate_partial_data(MenuItemSerializer.parse_input(request.data))
 
+            price_changed = 'price' in data and item.price != data['price']
             if 'title' in data:  item.title = data['title']
             if 'price' in data:  item.price = data['price']
             if 'category' in data: item.category = Category.objects.get(id=data['category'])
 
-            item.save()
+            with transaction.atomic(using=item._state.db):
+                item.save()
+                if price_changed:
+                    reprice_carts(MenuItem.objects.filter(id=item.id))
             return Response({'message': 'Menu item \'{}\' updated'.format(item.title)}, status=200)
         except MenuItem.DoesNotExist:
             return Response({'message': 'Invalid menu item id: \'{}\''.format(pk)}, status=404)
@@ -108,18 +147,85 @@ class MenuItemView(generics.RetrieveUpdateDestroyAPIView):
             return Response({'message': str(e)}, status=404)
 
     def delete(self, request, pk):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'Unauthorized Access'}, status=403)
 
         try:
-            item = MenuItem.objects.get(pk=pk)
-            item.delete()
+            item = self.get_queryset().get(pk=pk)
+            remove_item(item)
         except MenuItem.DoesNotExist:
             return Response({'message': 'Menu item does not exist.'}, status=400)
 
         return Response({'message': 'Menu item deleted'}, status=200)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([TenCallsPerMinute])
+def reprice_menu_items(request):
+    if 'percent' not in request.data:
+        return Response({'error': 'Missing data: \'percent\'.'}, status=400)
+    try:
+        percent = Decimal(str(request.data['percent']))
+    except InvalidOperation:
+        return Response({'error': 'percent: expected a number'}, status=400)
+    # +7500 % takes 0.01 to 75.00
+    if not percent.is_finite() or not -100 <= percent <= 7500:
+        return Response({'error': 'percent: expected a number between -100 and 7500'}, status=400)
+    basis_points = int((percent * 100).to_integral_value(ROUND_HALF_UP))
+
+    menuitems = MenuItem.objects.filter(location=request.location, available=True)
+    try:
+        if 'category' in request.data:
+            menuitems = menuitems.filter(category_id=CategorySerializer.get_id_from_field(request.data['category']))
+        if 'ids' in request.data:
+            try:
+                menuitems = menuitems.filter(id__in=id_list(request.data, 'ids'))
+            except ValueError:
+                return Response({'error': 'ids: expected a list of menu item ids'}, status=400)
+        items, carts = reprice_menu(menuitems, basis_points)
+    except ValidationError as e:
+        return Response({'error': str(e)}, status=400)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    return Response({'message': '{} menu items and {} cart lines repriced'.format(items, carts)}, status=200)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@throttle_classes([SixtyCallsPerMinute])
+def featured_menu_items(request):
+    featured = featured_items(request.location.id)
+    response = Response({'special': daily_special(featured), 'featured': featured}, status=200)
+    response.catalogue_variant = True
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([TenCallsPerMinute])
+def toggle_featured_menu_items(request):
+    if 'ids' not in request.data:
+        return Response({'error': 'Missing data: \'ids\'.'}, status=400)
+    featured = attempt_parse_as_boolean(request.data.get('featured', True))
+    if type(featured) is not bool:
+        return Response({'error': 'featured: expected boolean value of true, false, 0, or 1'}, status=400)
+
+    try:
+        ids = id_list(request.data, 'ids')
+    except ValueError:
+        return Response({'error': 'ids: expected a list of menu item ids'}, status=400)
+
+    db = router.db_for_write(MenuItem)
+    with transaction.atomic(using=db):
+        updated = MenuItem.objects.filter(id__in=ids, location=request.location, available=True) \
+            .update(featured=featured)
+        transaction.on_commit(lambda: bump_version(request.location.id), using=db)
+    return Response({'message': '{} menu items updated'.format(updated)}, status=200)
+
+
 class CategoryViewset(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -127,98 +233,93 @@ class CategoryViewset(viewsets.ModelViewSet):
     search_fields = ['title']
 
 
-@api_view(['GET', 'POST'])
-@permission_classes([IsAuthenticated, IsManager])
-@throttle_classes([TenCallsPerMinute])
-def managers_list_assign(request):
+def group_members(request, group_name, error_key='error'):
+    group = Group.objects.get(name=group_name)
+
     if request.method == 'GET':
-        managers = Group.objects.get(name='Manager')
-        serial = UserSerializer(managers.user_set, many=True)
-        return Response(serial.data, status=200)
+        users = group.user_set.order_by('id')
+        if 'search' in request.query_params:
+            search = request.query_params['search']
+            users = users.filter(Q(username__icontains=search) | Q(first_name__icontains=search)
+                                 | Q(last_name__icontains=search) | Q(email__icontains=search))
+        if 'page' in request.query_params or 'page_size' in request.query_params:
+            paginator = GroupMembersPagination()
+            page = paginator.paginate_queryset(users, request)
+            return paginator.get_paginated_response(UserSerializer(page, many=True).data)
+        return Response(UserSerializer(users, many=True).data, status=200)
+
+    try:
+        ids, usernames = user_identifiers(request.data)
+    except (TypeError, ValueError):
+        return Response({error_key: 'id: expected integer user ids'}, status=400)
+    if not ids and not usernames:
+        return Response({error_key: 'Missing valid User id or username'}, status=400)
+
+    users, missing = find_users(ids, usernames)
+    if not users:
+        return Response({error_key: 'No user found with {}'.format(', '.join(str(value) for value in missing))},
+                        status=404)
 
     if request.method == 'POST':
-        einfo = None
-        try:
-            managers = Group.objects.get(name='Manager')
-            if 'id' in request.data:
-                einfo = 'id: \'{}\''.format(request.data['id'])
-                user = User.objects.get(id=request.data['id'])
-                managers.user_set.add(user)
-                return Response({'message': 'User \'{}\' added to Manager Group'.format(user.username)}, status=201)
-            if 'username' in request.data:
-                einfo = 'username: \'{}\''.format(request.data['username'])
-                user = User.objects.get(username=request.data['username'])
-                managers.user_set.add(user)
-                return Response({'message': 'User \'{}\' added to Manager Group'.format(user.username)}, status=201)
-            return Response({'error': 'Missing valid User id or username'}, status=400)
-        except User.DoesNotExist:
-            return Response({'error': 'No user found with {}'.format(einfo)}, status=404)
+        add_to_group(group, users)
+        if len(ids) + len(usernames) == 1:
+            return Response({'message': 'User \'{}\' added to {} group'.format(users[0].username, group_name)},
+                            status=201)
+        return Response({'message': '{} users added to {} group'.format(len(users), group_name),
+                         'missing': missing}, status=201)
 
+    if request.method == 'DELETE':
+        removed = remove_from_group(group, users)
+        return Response({'message': '{} users removed from {} group'.format(removed, group_name),
+                         'missing': missing}, status=200)
 
-@api_view(['DELETE'])
-@permission_classes({IsAuthenticated, IsManager})
-@throttle_classes([TenCallsPerMinute])
-def managers_remove(request, pk):
+
+def remove_group_member(group_name, pk):
     try:
         user = User.objects.get(pk=pk)
-        managers = Group.objects.get(name='Manager')
-        managers.user_set.remove(user)
-        return Response({'message': 'Successfully removed \'{}\' from Manager group.'.format(user.username)},
+        remove_from_group(Group.objects.get(name=group_name), [user])
+        return Response({'message': 'Successfully removed \'{}\' from {} group.'.format(user.username, group_name)},
                         status=200)
     except User.DoesNotExist:
         return Response({'message': 'No user found with id: \'{}\''.format(pk)}, status=404)
 
 
-@api_view(['GET', 'POST'])
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([TenCallsPerMinute])
+def managers_list_assign(request):
+    return group_members(request, 'Manager')
+
+
+@api_view(['DELETE'])
 @permission_classes({IsAuthenticated, IsManager})
 @throttle_classes([TenCallsPerMinute])
-def delivery_list_assign(request):
-    if request.method == 'GET':
-        managers = Group.objects.get(name='Delivery Crew')
-        serial = UserSerializer(managers.user_set, many=True)
-        return Response(serial.data, status=200)
+def managers_remove(request, pk):
+    return remove_group_member('Manager', pk)
 
-    if request.method == 'POST':
-        einfo = None
-        try:
-            managers = Group.objects.get(name='Delivery Crew')
-            if 'id' in request.data:
-                einfo = 'id: \'{}\''.format(request.data['id'])
-                user = User.objects.get(id=request.data['id'])
-                managers.user_set.add(user)
-                return Response({'message': 'User \'{}\' added to Delivery Crew Group'.format(user.username)},
-                                status=201)
-            if 'username' in request.data:
-                einfo = 'username: \'{}\''.format(request.data['username'])
-                user = User.objects.get(username=request.data['username'])
-                managers.user_set.add(user)
-                return Response({'message': 'User \'{}\' added to Delivery Crew group'.format(user.username)},
-                                status=201)
-            return Response({'message': 'Missing valid User id or username'}, status=400)
-        except User.DoesNotExist:
-            return Response({'message': 'No user found with {}'.format(einfo)}, status=404)
+
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes({IsAuthenticated, IsManager})
+@throttle_classes([TenCallsPerMinute])
+def delivery_list_assign(request):
+    # this endpoint has always reported errors under 'message'
+    return group_members(request, 'Delivery Crew', error_key='message')
 
 
 @api_view(['DELETE'])
 @permission_classes({IsAuthenticated, IsManager})
 @throttle_classes([TenCallsPerMinute])
 def delivery_remove(request, pk):
-    try:
-        user = User.objects.get(pk=pk)
-        delivery_crew = Group.objects.get(name='Delivery Crew')
-        delivery_crew.user_set.remove(user)
-        return Response({'message': 'Successfully removed \'{}\' from Delivery Crew group.'.format(user.username)},
-                        status=200)
-    except User.DoesNotExist:
-        return Response({'message': 'No user found with id: \'{}\''.format(pk)}, status=404)
+    return remove_group_member('Delivery Crew', pk)
 
 
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated, IsCustomer])
 @throttle_classes([TenCallsPerMinute])
+@idempotent
 def cart_view(request):
     if request.method == 'GET':
-        items = Cart.objects.filter(user=request.user)
+        items = Cart.objects.filter(user=request.user, location=request.location).select_related('menuitem')
         serial = CartSerializer(items, many=True)
         return Response(serial.data, status=200)
 
@@ -226,13 +327,15 @@ def cart_view(request):
         menuitem = None
         try:
             try:
-                menuitem = MenuItem.objects.filter(id=int(request.data['menuitem']))
+                menuitem = MenuItem.objects.filter(id=int(request.data['menuitem']), location=request.location,
+                                                   available=True)
                 if not menuitem.exists():
                     return Response({'message': 'menu item \'{}\' not found'.format(request.data['menuitem'])},
                                     status=404)
                 menuitem = menuitem[0]
             except ValueError:
-                menuitem = MenuItem.objects.filter(title=request.data['menuitem'])
+                menuitem = MenuItem.objects.filter(title=request.data['menuitem'], location=request.location,
+                                                   available=True)
                 if not menuitem.exists():
                     return Response({'message': 'menu item \'{}\' not found'.format(request.data['menuitem'])},
                                     status=404)
@@ -242,9 +345,12 @@ def cart_view(request):
             unit_price = menuitem.price
             price = quantity * unit_price
 
-            cart = Cart.objects.create(user=user, menuitem=menuitem, quantity=quantity, unit_price=unit_price,
-                                       price=price)
-            cart.save()
+            db = router.db_for_write(Cart)
+            with transaction.atomic(using=db):
+                cart = Cart.objects.create(user=user, menuitem=menuitem, quantity=quantity, unit_price=unit_price,
+                                           price=price, location=request.location)
+                # the Idempotency-Key transaction around the view may still roll back
+                transaction.on_commit(lambda: invalidate_cart_summary(request.location.id, user.id), using=db)
             return Response({'message': 'cart updated'}, status=200)
         except MultiValueDictKeyError as e:
             return Response({'message': 'Missing named variable {}'.format(str(e))}, status=404)
@@ -252,132 +358,182 @@ def cart_view(request):
             return Response({'message': 'quantity value \'{}\' invalid.'.format(str(e))}, status=404)
         except IntegrityError:
             return Response({'message': 'MenuItem is already present in cart.'}, status=400)
+        except ParseError:
+            # malformed bodies get the parser's 400
+            raise
         except Exception as e:
             return Response({'message': str(type(e)) + str(e)}, status=404)
 
     if request.method == 'DELETE':
-        cart = Cart.objects.filter(user=request.user).delete()
+        cart = Cart.objects.filter(user=request.user, location=request.location).delete()
+        transaction.on_commit(lambda: invalidate_cart_summary(request.location.id, request.user.id),
+                              using=router.db_for_write(Cart))
         return Response({'message': 'cart has been emptyed for user \'{}\''.format(request.user.username)}, status=200)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsCustomer])
+@throttle_classes([SixtyCallsPerMinute])
+def cart_summary_view(request):
+    return Response(cart_summary(request.location.id, request.user.id), status=200)
+
+
 class OrdersView(generics.ListCreateAPIView):
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
     throttle_classes = [TenCallsPerMinute]
 
     def get(self, request):
-        if request.user.groups.filter(name="Customer").exists():
+        include_history = attempt_parse_as_boolean(request.query_params.get('history', 'false')) is True
+        try:
+            fields, expand = sparse_fieldset(request.query_params, ORDER_FIELDS, OrderSerializer.Meta.expandable)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        if "Customer" in user_roles(request.user):
             try:
-                orders = Order.objects.filter(user=request.user)
-                output = []
-                index = 0
-                for order in orders:
-                    serial = OrderSerializer(order)
-                    output.append(serial.data)
-                    if output[index]['delivery_crew']:
-                        output[index]['delivery_crew'] = output[index]['delivery_crew']['username']
-                    output[index]['orderitems'] = build_order_item_list(order)
-                    index += 1
-                return Response(output, status=200)
+                orders = with_order_details(Order.objects.filter(user=request.user, location=request.location),
+                                            fields, expand)
+                if include_history:
+                    orders = chain(orders, with_order_details(
+                        ArchivedOrder.objects.filter(user=request.user, location=request.location), fields, expand))
+                return Response([order_representation(order, fields, expand) for order in orders], status=200)
             except Order.DoesNotExist:
                 return Response('requested order does not exist', status=404)
 
-        if request.user.groups.filter(name="Delivery Crew").exists():
+        if "Delivery Crew" in user_roles(request.user):
             try:
-                orders = Order.objects.filter(delivery_crew=request.user)
-                output = []
-                index = 0
-                for order in orders:
-                    serial = OrderSerializer(order)
-                    output.append(serial.data)
-                    if output[index]['delivery_crew']:
-                        output[index]['delivery_crew'] = output[index]['delivery_crew']['username']
-                    output[index]['orderitems'] = build_order_item_list(order)
-                    index += 1
-                return Response(output, status=200)
+                orders = with_order_details(
+                    Order.objects.filter(delivery_crew=request.user, location=request.location), fields, expand)
+                if include_history:
+                    orders = chain(orders, with_order_details(
+                        ArchivedOrder.objects.filter(delivery_crew=request.user, location=request.location),
+                        fields, expand))
+                return Response([order_representation(order, fields, expand) for order in orders], status=200)
             except Order.DoesNotExist:
                 return Response('requested order does not exist', status=404)
 
-        if request.user.groups.filter(name="Manager").exists():
+        if "Manager" in user_roles(request.user):
             try:
+                orders = list(with_order_details(Order.objects.filter(location=request.location), fields, expand,
+                                                 with_user=True))
+                if include_history:
+                    orders += with_order_details(ArchivedOrder.objects.filter(location=request.location), fields,
+                                                 expand, with_user=True)
+                orders_by_user = {}
+                for order in orders:
+                    orders_by_user.setdefault(order.user_id, []).append(order)
+
                 output = []
-                users = User.objects.all()
-                iu = 0
-                for user in users:
-                    orders = Order.objects.filter(user=user)
-                    if not orders:
-                        continue
-
-                    output.append(UserSerializer(user).data)
-                    output[iu]['orders'] = []
-                    io = 0
-                    for order in orders:
-                        serial = OrderSerializer(order)
-                        output[iu]['orders'].append(serial.data)
-                        if output[iu]['orders'][io]['delivery_crew']:
-                            output[iu]['orders'][io]['delivery_crew'] = output[iu]['orders'][io]['delivery_crew'][
-                                'username']
-                        output[iu]['orders'][io]['orderitems'] = build_order_item_list(order)
-                        io += 1
-                    iu += 1
+                for user_id in sorted(orders_by_user):
+                    orders = orders_by_user[user_id]
+                    output.append(UserSerializer(orders[0].user).data)
+                    output[-1]['orders'] = [order_representation(order, fields, expand) for order in orders]
                 return Response(output, status=200)
             except Order.DoesNotExist as e:
                 return Response('requested order does not exist', status=404)
 
         return Response({'message': 'unauthorized access'}, status=403)
 
+    @method_decorator(idempotent)
     def post(self, request):
-        if not request.user.groups.filter(name="Customer").exists():
+        if "Customer" not in user_roles(request.user):
             return Response({'message': 'Unauthorized access.'}, status=403)
         try:
-            cart = Cart.objects.filter(user=request.user)
+            cart = Cart.objects.filter(user=request.user, location=request.location)
             if not cart.exists():
                 return Response({'message': 'no items are currently in cart'}, status=400)
             if 'date' in request.data:
-                order_date = request.data
+                order_date = parse_datetime(str(request.data['date']))
+                if order_date is None:
+                    return Response({'message': 'date: expected an ISO 8601 timestamp'}, status=400)
+                if timezone.is_naive(order_date):
+                    order_date = timezone.make_aware(order_date)
+                check_schedule(order_date)
             else:
-                order_date = datetime.datetime.now()
-            new_order = Order.objects.create(user=request.user, total=0, date=datetime.datetime.now())
-            new_order.save()
-            total = 0
-            for item in cart:
-                new_order.total += item.price
-                orderitem = OrderItem.objects.create(order=new_order, menuitem=item.menuitem, quantity=item.quantity,
-                                                     unit_price=item.unit_price, price=item.price)
-                orderitem.save()
-            new_order.save()
-            cart.delete()
+                order_date = timezone.now()
+                check_open(order_date)
+            # the cart, order, slot, tickets, task queue and idempotency key all live in the location's database
+            with order_transaction():
+                total = cart.aggregate(total=Sum('price'))['total']
+                slot = book_slot(request.location, order_date)
+                new_order = Order.objects.create(user=request.user, total=total, date=order_date, slot=slot,
+                                                 location=request.location)
+                cart_items = list(cart)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=new_order, menuitem_id=item.menuitem_id, quantity=item.quantity,
+                              unit_price=item.unit_price, price=item.price)
+                    for item in cart_items
+                ])
+                create_tickets(new_order, cart_items)
+                cart.delete()
+                transaction.on_commit(lambda: invalidate_cart_summary(request.location.id, request.user.id),
+                                      using=order_db())
+                send_order_receipt.enqueue(order_id=new_order.id, location=request.location.slug)
             return Response({'message': 'order number {:06d} placed.'.format(new_order.id)}, status=201)
+        except SlotFull as e:
+            return Response({'message': str(e)}, status=409)
+        except ValueError as e:
+            return Response({'message': str(e)}, status=400)
+        except ParseError:
+            raise
         except Exception as e:
-            new_order.delete()
             return Response(str(e), status=400)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([SixtyCallsPerMinute])
+def order_slots(request):
+    if 'date' in request.query_params:
+        day = parse_date(request.query_params['date'])
+        if day is None:
+            return Response({'error': 'date: expected an ISO 8601 date'}, status=400)
+    else:
+        day = timezone.localdate()
+    return Response(slot_availability(request.location, day), status=200)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsCustomer])
+@throttle_classes([TenCallsPerMinute])
+@idempotent
+def reorder_view(request, pk):
+    try:
+        lines, unavailable = reorder(request.user, pk, request.location)
+    except Order.DoesNotExist:
+        return Response({'message': 'order number {} not found.'.format(pk)}, status=404)
+    return Response({'message': '{} items from order {} added to cart'.format(lines, pk),
+                     'unavailable': unavailable}, status=200)
+
+
 class OrderView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
     throttle_classes = [TenCallsPerMinute]
 
     def get(self, request, pk):
-        if request.user.groups.filter(name="Customer").exists():
+        if "Customer" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
-                if request.user != order.user:
+                fields, expand = sparse_fieldset(request.query_params, ORDER_FIELDS, OrderSerializer.Meta.expandable)
+                order = with_order_details(Order.objects.filter(id=pk, location=request.location), fields,
+                                           expand).first() \
+                    or with_order_details(ArchivedOrder.objects.filter(id=pk, location=request.location), fields,
+                                          expand).get()
+                if request.user.id != order.user_id:
                     return Response({'message': 'order {} does not belong to customer'.format(pk)}, status=403)
-                output = OrderSerializer(order).data
-                if output['delivery_crew']:
-                    output['delivery_crew'] = order.delivery_crew.id
-                output['orderitems'] = build_order_item_list(order)
-                return Response(output, status=200)
+                return Response(order_representation(order, fields, expand, crew_field='id'), status=200)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
 
-            except Order.DoesNotExist:
+            except ArchivedOrder.DoesNotExist:
                 return Response({'message': 'order number {} not found.'.format(pk)}, status=404)
         return Response({'message': 'unathorized access. Customer endpoint'}, status=403)
 
     def put(self, request, pk):
-        if request.user.groups.filter(name="Delivery Crew").exists():
+        if "Delivery Crew" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 order.status = attempt_parse_as_boolean(request.data['status'])
                 order.save()
                 return Response({'message': 'order status successfully updated'}, status=200)
@@ -390,9 +546,9 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
             except Exception as e:
                 return Response({'error': str(type(e)) + str(e)}, status=400)
 
-        if request.user.groups.filter(name="Manager").exists():
+        if "Manager" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 order.status = attempt_parse_as_boolean(request.data['status'])
                 if is_null_string(request.data['delivery_crew']):
                     order.delivery_crew = None
@@ -412,9 +568,9 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
             except Exception as e:
                 return Response({'error': str(type(e)) + str(e)}, status=400)
 
-        if request.user.groups.filter(name="Customer").exists():
+        if "Customer" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 if order.user != request.user:
                     return Response({'error': 'order does not belong to user'}, status=400)
                 if order.delivery_crew != None:
@@ -427,7 +583,8 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
 
                 delta_price = 0
                 item.qantity = request.data['quantity']
-                item.menuitem = MenuItem.objects.get(id=request.data['menuitem'])
+                item.menuitem = MenuItem.objects.get(id=request.data['menuitem'], location=request.location,
+                                                     available=True)
                 item.unit_price = item.menuitem.price
                 delta_price = item.price
                 item.price = item.unit_price * item.quantity
@@ -451,9 +608,9 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
         return Response({'message': 'unauthorizd access'}, status=403)
 
     def patch(self, request, pk):
-        if request.user.groups.filter(name="Manager").exists():
+        if "Manager" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 if 'status' in request.data:
                     order.status = attempt_parse_as_boolean(request.data['status'])
                 if 'username' in request.data:
@@ -475,9 +632,9 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
             except Exception as e:
                 return Response({'error': str(type(e)) + str(e)}, status=400)
 
-        if request.user.groups.filter(name="Delivery Crew").exists():
+        if "Delivery Crew" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 order.status = attempt_parse_as_boolean(request.data['status'])
                 order.save()
                 return Response({'message': 'order status successfully updated'}, status=200)
@@ -490,9 +647,9 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
             except Exception as e:
                 return Response({'error': str(type(e)) + str(e)}, status=400)
 
-        if request.user.groups.filter(name="Customer").exists():
+        if "Customer" in user_roles(request.user):
             try:
-                order = Order.objects.get(id=pk)
+                order = Order.objects.get(id=pk, location=request.location)
                 if order.user != request.user:
                     return Response({'error': 'order does not belong to user'}, status=400)
                 if order.delivery_crew != None:
@@ -507,7 +664,8 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
                 if 'quantity' in request.data:
                     item.qantity = request.data['quantity']
                 if 'menuitem' in request.data:
-                    item.menuitem = MenuItem.objects.get(id=request.data['menuitem'])
+                    item.menuitem = MenuItem.objects.get(id=request.data['menuitem'], location=request.location,
+                                                         available=True)
                     item.unit_price = item.menuitem.price
                     delta_price = item.price
                     item.price = item.unit_price * item.quantity
@@ -531,11 +689,87 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
         return Response({'message': 'unauthorizd access'}, status=403)
 
     def delete(self, request, pk):
-        if not request.user.groups.filter(name="Manager").exists():
+        if "Manager" not in user_roles(request.user):
             return Response({'message': 'unauthorizd access'}, status=403)
         try:
-            order = Order.objects.get(id=pk)
-            order.delete()
+            order = Order.objects.select_related('slot').get(id=pk, location=request.location)
+            with transaction.atomic(using=order._state.db):
+                remove_tickets([order])
+                order.delete()
+                if order.slot is not None and order.slot.start > timezone.now():
+                    release_slot(request.location, order.slot)
             return Response({'message': 'order {} deleted'.format(pk)}, status=200)
         except Order.DoesNotExist:
             return Response({'error': 'order {} not found'.format(pk)}, status=404)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([SixtyCallsPerMinute])
+def kitchen_queue(request):
+    open_items = PreparationTicket.objects.filter(location=request.location, done=False) \
+        .values('menuitem', 'menuitem__title') \
+        .annotate(quantity=Sum('quantity')).order_by('menuitem')
+    output = [{'menuitem': row['menuitem'], 'title': row['menuitem__title'], 'quantity': row['quantity']}
+              for row in open_items]
+    return Response(output, status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([SixtyCallsPerMinute])
+def kitchen_tickets(request):
+    if 'since' in request.query_params:
+        try:
+            since = int(request.query_params['since'])
+        except ValueError:
+            return Response({'error': 'since: expected the cursor of an earlier response'}, status=400)
+        tickets = list(PreparationTicket.objects.filter(location=request.location, position__gt=since)
+                       .order_by('position'))
+        removed = list(RemovedTicket.objects.filter(position__gt=since, location=request.location)
+                       .order_by('position').values_list('position', 'ticket_id'))
+        cursor = max([since] + [ticket.position for ticket in tickets[-1:]]
+                     + [position for position, _ in removed[-1:]])
+    else:
+        # read before the tickets, every change up to the cursor is then part of the listing
+        cursor = last_position()
+        # tickets of orders that just committed have yet to be placed, they come last
+        tickets = PreparationTicket.objects.filter(location=request.location, done=False) \
+            .order_by(F('position').asc(nulls_last=True), 'id')
+        removed = []
+
+    serial = PreparationTicketSerializer(tickets, many=True)
+    return Response({'cursor': cursor, 'tickets': serial.data, 'removed': [ticket_id for _, ticket_id in removed]},
+                    status=200)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([SixtyCallsPerMinute])
+def kitchen_ticket_done(request, pk):
+    try:
+        ticket = PreparationTicket.objects.get(id=pk, location=request.location)
+        set_done(ticket, attempt_parse_as_boolean(request.data.get('done', True)) is True)
+        return Response(PreparationTicketSerializer(ticket).data, status=200)
+    except PreparationTicket.DoesNotExist:
+        return Response({'error': 'ticket {} not found'.format(pk)}, status=404)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([SixtyCallsPerMinute])
+def profiles_list(request):
+    return Response(list_profiles(), status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsManager])
+@throttle_classes([SixtyCallsPerMinute])
+def profile_detail(request, name):
+    sort = request.query_params.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return Response({'error': 'sort: expected cumulative, tottime or calls'}, status=400)
+    try:
+        return Response({'name': name, 'report': profile_report(name, sort)}, status=200)
+    except FileNotFoundError:
+        return Response({'error': 'no profile named \'{}\''.format(name)}, status=404)